@@ -0,0 +1,193 @@
+"""
+HTTP/2 session for the sync container registry client.
+
+The session implements the subset of the requests.Session interface used by
+coregio.registry_api.ContainerRegistry and sends the requests using
+httpx.Client with HTTP/2 enabled. Responses are converted to
+requests.Response objects so the rest of the client doesn't need to know
+which session is used.
+"""
+
+import threading
+from typing import Any, Dict, Optional, Union
+
+import httpx
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from coregio.registry_auth import HTTPBasicAuthWithB64, HTTPBearerAuth, HTTPOAuth2
+from coregio.registry_auth_httpx import (
+    HTTPXBasicAuthWithB64,
+    HTTPXBearerAuth,
+    HTTPXOAuth2,
+)
+
+# The requests based auth classes can't be used with httpx, the equivalent
+# httpx auth classes are used instead
+AUTH_CLASSES: Dict[Any, Any] = {
+    HTTPBearerAuth: HTTPXBearerAuth,
+    HTTPOAuth2: HTTPXOAuth2,
+    HTTPBasicAuthWithB64: HTTPXBasicAuthWithB64,
+}
+
+
+class HTTP2Session:
+    """
+    requests.Session like session which sends requests over HTTP/2.
+
+    Many concurrent requests to a registry share a single HTTP/2 connection
+    instead of each of them waiting for a free HTTP/1.1 connection.
+
+    Unlike the default requests session of the registry client, failed
+    requests are not retried.
+    """
+
+    DEFAULT_LIMITS = httpx.Limits(max_connections=32)
+
+    def __init__(
+        self, proxy: Optional[str] = None, client: Optional[httpx.Client] = None
+    ) -> None:
+        """
+        Args:
+        proxy (Optional, str): Proxy URL used for https requests
+        client (Optional, httpx.Client): Client used for requests verifying
+            the server identity
+        """
+        self.proxy = proxy
+        self.client = client or self._create_client(proxy)
+        # TLS verification is configured per client, the client for requests
+        # which don't verify the server identity is created on first use
+        self._insecure_client: Optional[httpx.Client] = None
+        self._lock = threading.Lock()
+
+        # Compatibility with requests.Session, auth is passed per request
+        self.auth: Any = None
+
+    @classmethod
+    def _create_client(cls, proxy: Optional[str], verify: bool = True) -> httpx.Client:
+        """
+        Create a HTTP/2 client with a proxy if set.
+
+        Args:
+            proxy (Optional[str]): Proxy URL used for https requests
+            verify (bool): Whether to verify the server identity
+
+        Returns:
+            httpx.Client: Registry client
+        """
+        mounts = None
+        if proxy:
+            mounts = {
+                "https://": httpx.HTTPTransport(
+                    http2=True, limits=cls.DEFAULT_LIMITS, proxy=proxy, verify=verify
+                )
+            }
+        return httpx.Client(
+            http2=True, limits=cls.DEFAULT_LIMITS, mounts=mounts, verify=verify
+        )
+
+    def _get_client(self, verify: bool) -> httpx.Client:
+        """
+        Get a client for requests with given TLS verification.
+
+        Args:
+            verify (bool): Whether to verify the server identity
+
+        Returns:
+            httpx.Client: Registry client
+        """
+        if verify:
+            return self.client
+        with self._lock:
+            if self._insecure_client is None:
+                self._insecure_client = self._create_client(self.proxy, verify=False)
+            return self._insecure_client
+
+    @staticmethod
+    def _get_timeout(timeout: Any) -> Union[httpx.Timeout, Any]:
+        """
+        Convert a requests timeout to a httpx timeout.
+
+        Args:
+            timeout (Any): Timeout in seconds or (connect, read) tuple
+
+        Returns:
+            Union[httpx.Timeout, Any]: httpx timeout
+        """
+        if timeout is None:
+            return httpx.USE_CLIENT_DEFAULT
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return httpx.Timeout(read, connect=connect)
+        return httpx.Timeout(timeout)
+
+    @staticmethod
+    def _to_requests_response(resp: httpx.Response) -> requests.Response:
+        """
+        Convert a httpx response to a requests response.
+
+        Args:
+            resp (httpx.Response): httpx response
+
+        Returns:
+            requests.Response: requests response with the content already read
+        """
+        response = requests.Response()
+        response.status_code = resp.status_code
+        response.headers = CaseInsensitiveDict(resp.headers)
+        response.url = str(resp.url)
+        response.reason = resp.reason_phrase
+        response.encoding = resp.encoding
+        # pylint: disable=protected-access
+        response._content = resp.content
+        response._content_consumed = True  # type: ignore[attr-defined]
+        return response
+
+    def request(  # pylint: disable=too-many-arguments,unused-argument
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, Any]] = None,
+        verify: bool = True,
+        timeout: Any = None,
+        proxies: Optional[Dict[str, Any]] = None,
+        auth: Optional[httpx.Auth] = None,
+        stream: bool = False,
+    ) -> requests.Response:
+        """
+        Send a HTTP request.
+
+        The arguments follow requests.Session.request. Proxies are configured
+        on the httpx client, so proxies are accepted only for compatibility.
+        The response content is always read.
+
+        Args:
+            method (str): HTTP method
+            url (str): Full URL for the request
+            params (Optional[Dict[str, Any]]): Request params
+            headers (Optional[Dict[str, Any]]): Request headers
+            verify (bool): Whether to verify the server identity
+            timeout (Any): Timeout in seconds or (connect, read) tuple
+            proxies (Optional[Dict[str, Any]]): Unused, set on the client
+            auth (Optional[httpx.Auth]): httpx auth object
+            stream (bool): Unused, the content is always read
+
+        Returns:
+            requests.Response: HTTP response object
+        """
+        resp = self._get_client(verify).request(
+            method,
+            url,
+            params=params,
+            headers=headers,
+            timeout=self._get_timeout(timeout),
+            auth=auth or httpx.USE_CLIENT_DEFAULT,
+        )
+        return self._to_requests_response(resp)
+
+    def close(self) -> None:
+        """Close the session."""
+        self.client.close()
+        if self._insecure_client is not None:
+            self._insecure_client.close()
@@ -1,13 +1,36 @@
 """Container registry API implementation."""
-import json
+# pylint: disable=too-many-lines
+import functools
+import itertools
 import logging
-from typing import Any, Dict, List, Optional, Callable
-from urllib.parse import urljoin, urlparse
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlencode, urlparse
 
 import requests
 
+try:
+    import ijson  # type: ignore[import-untyped]
+except ImportError:  # pragma: no cover
+    ijson = None
+
 from coregio import utils
-from coregio.registry_auth import HTTPBearerAuth, HTTPOAuth2, HTTPBasicAuthWithB64
+from coregio.registry_auth import (
+    BearerAuthBase,
+    DiskTokenCache,
+    HTTPBearerAuth,
+    HTTPOAuth2,
+    HTTPBasicAuthWithB64,
+)
+
+try:
+    from coregio.http2_session import AUTH_CLASSES as HTTP2_AUTH_CLASSES
+    from coregio.http2_session import HTTP2Session
+except ImportError:  # pragma: no cover
+    HTTP2Session = None  # type: ignore[assignment,misc]
 
 LOGGER = logging.getLogger(__name__)
 
@@ -22,6 +45,11 @@ ACCEPT_HEADERS = {
     "docker_manifest_v1": "application/vnd.docker.distribution.manifest.v1+json",
 }
 
+# Accept header used when no specific manifest types are requested
+_DEFAULT_ACCEPT = ", ".join(
+    [ACCEPT_HEADERS["docker_manifest_v2"], ACCEPT_HEADERS["oci_manifest"]]
+)
+
 # There is something special about docker.io registry
 # The content is reference with classic docker.io alias but in fact
 # it is stored in index.docker.io
@@ -34,47 +62,155 @@ SPECIAL_DOCKER_ALIASES = {
     "registry.hub.docker.com": "index.docker.io",
 }
 
+# Registry uses different auth methods and we don't know which one to use until
+# we make a request. The methods are tried in the given order.
+AUTH_METHODS = (HTTPBearerAuth, HTTPOAuth2, HTTPBasicAuthWithB64)
+
+# The last successful auth method per registry URL. The method is tried first
+# in subsequent requests to avoid unsuccessful round-trips with other methods.
+_AUTH_METHOD_CACHE: Dict[str, Any] = {}
 
-class ContainerRegistry:
+
+@functools.lru_cache(maxsize=8)
+def _parse_docker_cfg(docker_cfg: str) -> Dict[str, Any]:
     """
-    Class which calls container registry API
+    Parse DockerConfigJson string. The parsed config is shared by all registry
+    objects created with the same config, so it must not be modified.
+
+    Args:
+        docker_cfg (str): DockerConfigJson string
+
+    Returns:
+        Dict[str, Any]: Parsed DockerConfigJson
+
+    Raises:
+        ValueError: If the config is not a valid json
     """
+    return utils.json_loads(docker_cfg)
+
+
+@functools.lru_cache(maxsize=64)
+def _join_accept_headers(manifest_types: Tuple[str, ...]) -> str:
+    """
+    Join accept headers of given manifest types. The order of the types
+    is kept since it expresses the preference of the types.
+
+    Args:
+        manifest_types (Tuple[str, ...]): Manifest types, i.e. index, manifest, ...
+
+    Returns:
+        str: Value of the Accept header
+    """
+    return ", ".join([ACCEPT_HEADERS[type] for type in manifest_types])
+
+
+def get_accept_header(manifest_types: Any = None) -> str:
+    """
+    Get Accept header value for given manifest types.
+
+    Args:
+        manifest_types (Optional, List[str]): What type of manifest
+            to get, i.e. index, manifest, ...
+
+    Returns:
+        str: Value of the Accept header. Docker v2 and OCI manifests are
+            accepted if no type is given.
+    """
+    if not manifest_types:
+        return _DEFAULT_ACCEPT
+    return _join_accept_headers(tuple(manifest_types))
+
+
+def _iter_results(
+    futures: Deque["Future[requests.Response]"],
+) -> Iterator[requests.Response]:
+    """
+    Iterate over results of futures in order. A future is removed from the
+    queue before its result is read.
+
+    Args:
+        futures (Deque[Future[requests.Response]]): Pending futures
+
+    Returns:
+        Iterator[requests.Response]: Results of the futures
+    """
+    while futures:
+        yield futures.popleft().result()
+
+
+def _discard_results(futures: Deque["Future[requests.Response]"]) -> None:
+    """
+    Cancel or wait for pending futures and close their responses, so streamed
+    responses don't hold pooled connections. Errors are ignored.
+
+    Args:
+        futures (Deque[Future[requests.Response]]): Pending futures
+    """
+    while futures:
+        future = futures.popleft()
+        if not future.cancel() and future.exception() is None:
+            future.result().close()
+
+
+# Size of chunks in which streamed responses are read
+CHUNK_SIZE = 64 * 1024
 
-    # Timeouts (connect, read) for HTTP requests
-    # (see https://requests.readthedocs.io/en/latest/user/advanced/#timeouts)
-    # Use a low connect timeout to fail early when trying to connect to an
-    # endpoint that is firewalled (dropping packets)
-    DEFAULT_TIMEOUT = (7.0, 15.0)
+
+# pylint: disable=too-few-public-methods
+class _ChunkReader:
+    """
+    File-like object reading data from an iterator of byte chunks.
+    """
+
+    def __init__(self, chunks: Iterator[bytes]) -> None:
+        self._chunks = chunks
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        Read the next chunk.
+
+        Args:
+            size (int): Zero size reads nothing, any other size reads a chunk
+
+        Returns:
+            bytes: Next chunk or empty bytes if there is no more data
+        """
+        if size == 0:
+            return b""
+        return next(self._chunks, b"")
+
+
+# pylint: disable=too-few-public-methods
+class BaseContainerRegistry:
+    """
+    Base class of container registry API clients. It handles the registry URL
+    and selection of the registry credentials from docker config.
+    """
 
     def __init__(
         self,
         url: str,
-        docker_cfg: Optional[str] = None,
-        session: Optional[Any] = None,
+        docker_cfg: Optional[Union[str, Dict[str, Any]]] = None,
         proxy: Optional[str] = None,
     ) -> None:
         """
         Args:
         url (str): URL of the registry to auth to
-        docker_cfg (Optional, str): DockerConfigJson string
+        docker_cfg (Optional, Union[str, Dict[str, Any]]): DockerConfigJson
+            string or already parsed DockerConfigJson
+        proxy (Optional, str): Proxy URL used for https requests
         """
-
         self.url = self._normalize_registry_url(url)
         self._original_url = url
+        self._url_keys = frozenset((self.url, self._original_url))
         self.docker_cfg = docker_cfg
-
-        if session:
-            self.session = session
-        else:
-            self.session = requests.Session()
-            utils.add_session_retries(self.session)
-
         self.proxy = proxy
 
-        self.auth_header = None
-        self._auth_session_cache = {}
+        # (docker config, token) of the last parsed docker config
+        self._auth_token: Optional[Tuple[Any, Any]] = None
 
     @staticmethod
+    @functools.lru_cache(maxsize=256)
     def _normalize_registry_url(url: str) -> str:
         """
         Normalize registry URL:
@@ -84,6 +220,9 @@ class ContainerRegistry:
         - Port number is preserved if present.
         - Path is discarded if present.
 
+        The normalized URL never ends with a slash or a path, API endpoint
+        paths are appended to it (see _get_full_url).
+
         Args:
             url: Registry URL
 
@@ -99,9 +238,40 @@ class ContainerRegistry:
             normalized_url = f"{normalized_url}:{parsed.port}"
         return normalized_url
 
+    def _get_full_url(self, path: str) -> str:
+        """
+        Get full URL of a registry API endpoint. The path is appended to
+        the normalized registry URL which is much cheaper than resolving it
+        using urljoin. Absolute URLs are returned unchanged.
+
+        Args:
+            path (str): Registry API endpoint path or absolute URL
+
+        Returns:
+            str: Full URL of the endpoint
+        """
+        if utils.SCHEME_PATTERN.match(path):
+            return path
+        return f"{self.url}/{path.lstrip('/')}"
+
     def _get_auth_token(self) -> Any:
         """
-        Extract registry auth token from docker_config_json.
+        Extract registry auth token from docker_config_json. The token is cached
+        until the docker config changes.
+
+        Returns:
+            Any: Registry auth token (base64 encoded) if available
+        """
+        if self._auth_token is not None and self._auth_token[0] is self.docker_cfg:
+            return self._auth_token[1]
+
+        token = self._parse_auth_token()
+        self._auth_token = (self.docker_cfg, token)
+        return token
+
+    def _parse_auth_token(self) -> Any:
+        """
+        Parse docker_config_json and select registry auth token.
 
         Returns:
             Any: Registry auth token (base64 encoded) if available
@@ -109,11 +279,14 @@ class ContainerRegistry:
         if not self.docker_cfg:
             return None
 
-        try:
-            docker_cfg_json = json.loads(self.docker_cfg)
-        except ValueError:
-            LOGGER.warning("Provided dockerConfigJson is not a valid json")
-            return None
+        if isinstance(self.docker_cfg, dict):
+            docker_cfg_json = self.docker_cfg
+        else:
+            try:
+                docker_cfg_json = _parse_docker_cfg(self.docker_cfg)
+            except ValueError:
+                LOGGER.warning("Provided dockerConfigJson is not a valid json")
+                return None
 
         registry_auths = docker_cfg_json.get("auths", {})
         auth = self._select_registry_auth_token_from_docker_config(registry_auths)
@@ -126,6 +299,41 @@ class ContainerRegistry:
         # otherwise use auth
         return auth.get("auth")
 
+    @staticmethod
+    def _index_registry_auths(
+        registry_auths: Dict[str, Any],
+    ) -> Dict[str, Tuple[int, Any]]:
+        """
+        Index docker config auths by all keys the registry can be matched with.
+
+        There are several formats of registry that can be stored in docker
+        config json. Each auth is indexed by:
+        - the registry key itself
+        - hostname of the registry key
+        - hostname without a subdomain (index.quay.io -> quay.io)
+
+        Args:
+            registry_auths (Dict[str, Any]): Authentication values from
+            docker config
+
+        Returns:
+            Dict[str, Tuple[int, Any]]: Position of the auth in docker config
+                and the auth by the matching key. The first auth in docker
+                config is kept if multiple auths share the same key.
+        """
+        index: Dict[str, Tuple[int, Any]] = {}
+        for position, (registry_key, auth) in enumerate(registry_auths.items()):
+            if not registry_key:
+                continue
+            index.setdefault(registry_key, (position, auth))
+
+            hostname = urlparse(utils.add_scheme_if_missing(registry_key)).hostname
+            if not hostname:
+                continue
+            index.setdefault(hostname, (position, auth))
+            index.setdefault(".".join(hostname.split(".")[-2:]), (position, auth))
+        return index
+
     def _select_registry_auth_token_from_docker_config(
         self, registry_auths: Dict[str, Any]
     ) -> Any:
@@ -139,49 +347,128 @@ class ContainerRegistry:
         Returns:
             Any: Authentication details
         """
-        for registry_key, auth in registry_auths.items():
-            if not registry_key:
-                continue
-            # There are several formats of registry that can be stored
-            # in docker config json. Let's compare URLs starting from basic method
-            # to more complex
+        index = self._index_registry_auths(registry_auths)
+        # The first auth in docker config that matches the registry wins
+        matches = [index[key] for key in self._url_keys.intersection(index)]
+        if not matches:
+            # No luck finding auth
+            return None
+        return min(matches, key=lambda match: match[0])[1]
 
-            # First let's try simple URL comparison
-            if self._cmp_registry_key(registry_key):
-                return auth
 
-            # Add a schema to the URL if missing
-            registry_key = utils.add_scheme_if_missing(registry_key)
+# pylint: disable=too-many-instance-attributes
+class ContainerRegistry(BaseContainerRegistry):
+    """
+    Class which calls container registry API
+    """
 
-            # Parse URL and compare matching hostname
-            parsed_key = urlparse(registry_key)
-            hostname = parsed_key.hostname
-            if not hostname:
-                continue
-            if self._cmp_registry_key(hostname):
-                return auth
+    # Timeouts (connect, read) for HTTP requests
+    # (see https://requests.readthedocs.io/en/latest/user/advanced/#timeouts)
+    # Use a low connect timeout to fail early when trying to connect to an
+    # endpoint that is firewalled (dropping packets)
+    DEFAULT_TIMEOUT = (7.0, 15.0)
+
+    # Successful manifest responses are cached in memory to avoid repeated
+    # round-trips to the registry. A tag may be moved to another manifest
+    # so cached responses expire after MANIFEST_CACHE_TTL seconds.
+    # The cache is disabled by setting MANIFEST_CACHE_SIZE to 0.
+    MANIFEST_CACHE_SIZE = 1024
+    MANIFEST_CACHE_TTL = 300.0
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        url: str,
+        docker_cfg: Optional[Union[str, Dict[str, Any]]] = None,
+        session: Optional[Any] = None,
+        proxy: Optional[str] = None,
+        disk_token_cache: Optional[DiskTokenCache] = None,
+        http2: bool = False,
+    ) -> None:
+        """
+        Args:
+        url (str): URL of the registry to auth to
+        docker_cfg (Optional, Union[str, Dict[str, Any]]): DockerConfigJson
+            string or already parsed DockerConfigJson
+        session (Optional, requests.Session): Session used for requests. Pass
+            a session from utils.make_shared_session to reuse connections when
+            working with many registries. Retries are added only to a session
+            created by default.
+        proxy (Optional, str): Proxy URL used for https requests
+        disk_token_cache (Optional, DiskTokenCache): Cache used to persist
+            Bearer tokens across processes. Not supported with HTTP/2.
+        http2 (bool): Send requests over HTTP/2 using httpx (requires
+            the async extra). Used only if no session is given. Failed
+            requests are not retried over HTTP/2.
+
+        Raises:
+            ValueError: If disk_token_cache is used with HTTP/2
+        """
+
+        super().__init__(url, docker_cfg=docker_cfg, proxy=proxy)
+
+        if session:
+            self.session = session
+        elif http2:
+            if HTTP2Session is None:  # pragma: no cover
+                raise ImportError("HTTP/2 support requires httpx[http2]")
+            self.session = HTTP2Session(proxy=proxy)
+        else:
+            self.session = requests.Session()
+            utils.add_session_retries(self.session)
+
+        if disk_token_cache is not None and self._uses_http2():
+            # The httpx auth classes keep tokens only in memory
+            raise ValueError("disk_token_cache is not supported with HTTP/2")
+        self.disk_token_cache = disk_token_cache
+
+        self.auth_header = None
+        self._auth_session_cache = {}
 
-            # Let's now strip a subdomain and compare the main domain
-            # index.quay.io -> quay.io
-            hostname_wo_subdomain = ".".join(hostname.split(".")[-2:])
+        # (repository, reference, accept header) -> (timestamp, response)
+        self._manifest_cache: OrderedDict = OrderedDict()
+        self._manifest_cache_lock = threading.Lock()
 
-            if self._cmp_registry_key(hostname_wo_subdomain):
-                return auth
+    def _uses_http2(self) -> bool:
+        """
+        Check whether requests are sent using the HTTP/2 session.
 
-        # No luck finding auth
-        return None
+        Returns:
+            bool: True if the session is a HTTP2Session
+        """
+        return HTTP2Session is not None and isinstance(self.session, HTTP2Session)
 
-    def _cmp_registry_key(self, registry_key: Optional[str]) -> bool:
+    def _get_auth(self, auth_class: Callable[[Any], Any]) -> Any:
         """
-        Check if given registry key correspond to the registry hosname
+        Get an auth object of a given class. The object is created using
+        the Docker config json auth token and it is cached for subsequent calls.
 
         Args:
-            registry_key (Optional[str]): Registry key from docker config
+            auth_class (Callable[[Any], Any]): Auth class
 
         Returns:
-            bool: Matching flag
+            Any: Auth object
         """
-        return registry_key in (self.url, self._original_url)
+        if auth_class not in self._auth_session_cache:
+            if self._uses_http2():
+                # The proxy is set on the httpx client
+                self._auth_session_cache[auth_class] = HTTP2_AUTH_CLASSES[auth_class](
+                    self._get_auth_token()
+                )
+                return self._auth_session_cache[auth_class]
+
+            # Create a new auth object and cache it. The auth object keeps
+            # a token cache so it must be reused across requests.
+            kwargs: Dict[str, Any] = {"proxy": self.proxy}
+            if (
+                self.disk_token_cache is not None
+                and isinstance(auth_class, type)
+                and issubclass(auth_class, BearerAuthBase)
+            ):
+                kwargs["disk_cache"] = self.disk_token_cache
+            self._auth_session_cache[auth_class] = auth_class(
+                self._get_auth_token(), **kwargs
+            )
+        return self._auth_session_cache[auth_class]
 
     def _get_session(self, auth_class: Callable[[Any], Any]) -> requests.Session:
         """
@@ -193,38 +480,51 @@ class ContainerRegistry:
         Returns:
             requests.Session: Registry session
         """
-
-        auth_token = self._get_auth_token()
-        if auth_class not in self._auth_session_cache:
-            # Create a new auth session and cache it
-            self._auth_session_cache[auth_class] = auth_class(
-                auth_token, proxy=self.proxy
-            )
-        self.session.auth = self._auth_session_cache[auth_class]
+        self.session.auth = self._get_auth(auth_class)
 
         return self.session
 
-    def _get(
+    def _get_auth_methods(self) -> List[Any]:
+        """
+        Get auth methods in the order they should be tried. The last successful
+        auth method for the registry goes first.
+
+        Returns:
+            List[Any]: Auth classes
+        """
+        cached_method = _AUTH_METHOD_CACHE.get(self.url)
+        if cached_method is None:
+            return list(AUTH_METHODS)
+        return [cached_method] + [
+            method for method in AUTH_METHODS if method is not cached_method
+        ]
+
+    def _request(  # pylint: disable=too-many-arguments
         self,
+        method: str,
         full_url: str,
         params: Optional[Dict[str, Any]] = None,
         headers: Optional[Dict[str, Any]] = None,
         verify: bool = True,
+        stream: bool = False,
     ) -> requests.Response:
         """
-        Make a HTTP GET request to url given by the arguments and use
+        Make a HTTP request to url given by the arguments and use
         multiple auth method as a failover.
 
         If one auth method returns 401 code a next request is made with another
         method until response is successful or we run out of methods.
 
         Args:
+            method (str): HTTP method, e.g. GET or HEAD
             full_url (str): Full URL for the request
             params (Optional[Dict[str, Any]], optional): Optional request params.
                 Defaults to None.
             headers (Optional[Dict[str, Any]], optional): Optional request headers.
                 Defaults to None.
             verify (bool, optional): Optional request verify flag. Defaults to True.
+            stream (bool, optional): Whether to stream the response content.
+                Defaults to False.
 
         Returns:
             requests.Response: HTTP response object
@@ -232,21 +532,31 @@ class ContainerRegistry:
         # Registry uses different auth methods and we don't know which one to use until
         # we make a request. This loop iterates over several methods and make requests
         # until it successfully returns valid response
-        for auth_method in (HTTPBearerAuth, HTTPOAuth2, HTTPBasicAuthWithB64):
-            session = self._get_session(auth_method)
-
-            resp = session.get(
+        for auth_method in self._get_auth_methods():
+            # The auth is passed per request instead of being set on the shared
+            # session so that requests made from multiple threads don't
+            # override each other's auth method
+            auth = self._get_auth(auth_method)
+
+            resp = self.session.request(
+                method,
                 full_url,
                 params=params,
                 headers=headers,
                 verify=verify,
                 timeout=self.DEFAULT_TIMEOUT,
                 proxies={"https": self.proxy} if self.proxy else None,
+                auth=auth,
+                stream=stream,
             )
 
-            self.auth_header = session.auth.auth_header
+            self.auth_header = auth.auth_header
             if resp.status_code != 401:
+                _AUTH_METHOD_CACHE[self.url] = auth_method
                 return resp
+            if stream:
+                # Release the connection of the unsuccessful streamed response
+                resp.close()
             LOGGER.debug(
                 "Auth method %s was un-successful. Trying another one. %s",
                 auth_method,
@@ -255,11 +565,46 @@ class ContainerRegistry:
 
         return resp
 
+    def _get(
+        self,
+        full_url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, Any]] = None,
+        verify: bool = True,
+        stream: bool = False,
+    ) -> requests.Response:
+        """
+        Make a HTTP GET request to url given by the arguments and use
+        multiple auth method as a failover.
+
+        Args:
+            full_url (str): Full URL for the request
+            params (Optional[Dict[str, Any]], optional): Optional request params.
+                Defaults to None.
+            headers (Optional[Dict[str, Any]], optional): Optional request headers.
+                Defaults to None.
+            verify (bool, optional): Optional request verify flag. Defaults to True.
+            stream (bool, optional): Whether to stream the response content.
+                Defaults to False.
+
+        Returns:
+            requests.Response: HTTP response object
+        """
+        return self._request(
+            "GET",
+            full_url,
+            params=params,
+            headers=headers,
+            verify=verify,
+            stream=stream,
+        )
+
     def get_request(
         self,
         path: str,
         params: Optional[Dict[str, Any]] = None,
         headers: Optional[Dict[str, Any]] = None,
+        stream: bool = False,
     ) -> requests.Response:
         """
         GET Registry API request to given uri
@@ -268,15 +613,16 @@ class ContainerRegistry:
             path: Registry API endpoint path
             params: Params to pass to Registry API endpoint
             headers: Headers to pass to Registry API endpoint
+            stream: Whether to stream the response content
 
         Returns:
             Response: The resulting Response object
         """
 
-        full_url = urljoin(self.url, path)
+        full_url = self._get_full_url(path)
 
         LOGGER.debug("Querying registry: GET %s %s %s", full_url, headers, params)
-        resp = self._get(full_url, params=params, headers=headers)
+        resp = self._get(full_url, params=params, headers=headers, stream=stream)
         utils.handle_response(resp)
         resp.raise_for_status()
 
@@ -285,7 +631,174 @@ class ContainerRegistry:
         )
         return resp
 
-    def get_paginated_response(  # pylint: disable=too-many-arguments
+    def head_request(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, Any]] = None,
+    ) -> requests.Response:
+        """
+        HEAD Registry API request to given uri
+
+        Args:
+            path: Registry API endpoint path
+            params: Params to pass to Registry API endpoint
+            headers: Headers to pass to Registry API endpoint
+
+        Returns:
+            Response: The resulting Response object
+        """
+        full_url = self._get_full_url(path)
+
+        LOGGER.debug("Querying registry: HEAD %s %s %s", full_url, headers, params)
+        resp = self._request("HEAD", full_url, params=params, headers=headers)
+        utils.handle_response(resp)
+        resp.raise_for_status()
+
+        LOGGER.debug(
+            "Registry HEAD query was successful - %s - %s", full_url, resp.status_code
+        )
+        return resp
+
+    @staticmethod
+    def _get_page_path(next_page: Optional[str]) -> Optional[str]:
+        """
+        Get path and query of the "next" page link. The link points to the same
+        registry, so the path is sufficient and the registry URL doesn't need
+        to be resolved again.
+
+        Args:
+            next_page (Optional[str]): URL of the next page
+
+        Returns:
+            Optional[str]: Path with the query of the next page
+        """
+        if not next_page:
+            return None
+        parsed = urlparse(next_page)
+        if not parsed.query:
+            return parsed.path
+        return f"{parsed.path}?{parsed.query}"
+
+    @staticmethod
+    def _get_page_query(
+        page: str, page_params: Optional[Dict[str, Any]]
+    ) -> Dict[str, List[str]]:
+        """
+        Get query params of a requested page.
+
+        Args:
+            page (str): URL of the page
+            page_params (Optional[Dict[str, Any]]): Params sent with the page
+
+        Returns:
+            Dict[str, List[str]]: Query params of the page
+        """
+        query = parse_qs(urlparse(page).query, keep_blank_values=True)
+        for param, value in (page_params or {}).items():
+            query[param] = [str(value)]
+        return query
+
+    @staticmethod
+    def _is_same_page(page: str, other_page: str) -> bool:
+        """
+        Check whether two page URLs point to the same page. Query params may be
+        ordered or encoded differently.
+
+        Args:
+            page (str): URL of a page
+            other_page (str): URL of another page
+
+        Returns:
+            bool: True if the URLs point to the same page
+        """
+        parsed, other_parsed = urlparse(page), urlparse(other_page)
+        return parsed.path == other_parsed.path and parse_qs(
+            parsed.query, keep_blank_values=True
+        ) == parse_qs(other_parsed.query, keep_blank_values=True)
+
+    @staticmethod
+    def _get_following_pages(
+        next_page: str, count: int, page_query: Dict[str, List[str]]
+    ) -> List[str]:
+        """
+        Predict URLs of the following pages based on the "next" page link.
+
+        Only numeric pagination (page number or record offset) can be predicted.
+        The offset stride is the difference between the offsets of the "next"
+        link and of the page it was returned with, since registries may return
+        less records per page than requested. Cursor based pagination,
+        e.g. "last=<tag>" used by Docker Distribution, is opaque - the cursor
+        is known only after the previous page is fetched.
+
+        Args:
+            next_page (str): URL of the next page
+            count (int): Number of pages to predict
+            page_query (Dict[str, List[str]]): Query params of the page
+                the "next" link was returned with
+
+        Returns:
+            List[str]: URLs of the following pages starting with the next page.
+                The list is empty if the pagination can't be predicted.
+        """
+        parsed = urlparse(next_page)
+        query = parse_qs(parsed.query, keep_blank_values=True)
+        for param in ("page", "offset"):
+            values = query.get(param, [])
+            if len(values) != 1 or not values[0].isdigit():
+                continue
+            start = int(values[0])
+            stride = 1
+            if param == "offset":
+                current = page_query.get(param, ["0"])
+                if len(current) != 1 or not current[0].isdigit():
+                    return []
+                stride = start - int(current[0])
+                if stride <= 0:
+                    return []
+            pages = []
+            for index in range(count):
+                query[param] = [str(start + index * stride)]
+                pages.append(
+                    parsed._replace(query=urlencode(query, doseq=True)).geturl()
+                )
+            return pages
+        return []
+
+    @staticmethod
+    def _get_page_data(
+        resp: requests.Response, list_name: str, max_items: int = 0
+    ) -> List[Any]:
+        """
+        Get data from a paginated response page.
+
+        If ijson is available the page is parsed incrementally while it is
+        downloaded, so the whole page doesn't need to be loaded in memory
+        and the download stops once max_items are read.
+
+        Args:
+            resp (requests.Response): Page response
+            list_name (str): Name that points to the list of data in the response
+            max_items (int): Maximum number of items to read, 0 means no limit
+
+        Returns:
+            List[Any]: Data of the page
+        """
+        if ijson is None:
+            page_data = utils.response_json(resp).get(list_name, [])
+            return page_data[:max_items] if max_items else page_data
+
+        try:
+            items = ijson.items(
+                _ChunkReader(resp.iter_content(chunk_size=CHUNK_SIZE)),
+                f"{list_name}.item",
+                use_float=True,
+            )
+            return list(itertools.islice(items, max_items or None))
+        finally:
+            resp.close()
+
+    def get_paginated_response(  # pylint: disable=too-many-arguments,too-many-locals
         self,
         path: str,
         list_name: str,
@@ -293,10 +806,14 @@ class ContainerRegistry:
         headers: Optional[Dict[str, Any]] = None,
         page_size: int = 100,
         limit: int = 0,
+        concurrency: int = 8,
     ) -> List[Any]:
         """
         Get Registry API paginated response. This only applies to responses with lists.
 
+        If the registry uses numeric pagination the following pages are
+        fetched concurrently. Otherwise pages are fetched one by one.
+
         Args:
             path (str): API endpoint path
             list_name (str): Name that points to the list of data in the response,
@@ -305,27 +822,85 @@ class ContainerRegistry:
             headers (Optional[Dict[str, Any]]): Request headers
             page_size (int): The number of records per page
             limit (int): Maximum limit of records
+            concurrency (int): Maximum number of pages fetched concurrently
 
         Returns:
             Any: Data returned by iterating over all available pages
         """
-        data = []
-        next_page = path
-        while True:
-            if not params:
-                params = {}
-            params["n"] = page_size
-            resp = self.get_request(next_page, headers=headers, params=params)
-            page_data = resp.json().get(list_name, [])
-            data.extend(page_data)
-
-            next_page = resp.links.get("next", {}).get("url")
-            if not next_page:
-                break
-            if limit != 0 and len(data) >= limit:
-                break
+        # The caller's params are not modified. They are sent only with the first
+        # request, the following page links already contain the query params.
+        first_page_params = dict(params or {})
+        first_page_params["n"] = page_size
+
+        def get_page(
+            page: str, page_params: Optional[Dict[str, Any]]
+        ) -> requests.Response:
+            return self.get_request(
+                page, headers=headers, params=page_params, stream=ijson is not None
+            )
 
-        return data[:limit] if limit else data
+        data: List[Any] = []
+        pages = [path]
+        page_params: Optional[Dict[str, Any]] = first_page_params
+        # Pages fetched concurrently which were not consumed yet
+        pending: Deque["Future[requests.Response]"] = deque()
+        executor: Optional[ThreadPoolExecutor] = None
+        # Following pages are predicted until a prediction turns out wrong
+        predictable = True
+        try:
+            while pages:
+                # Results are consumed in order. Pages fetched beyond the last
+                # one are discarded together with their potential errors.
+                if len(pages) > 1:
+                    if executor is None:
+                        executor = ThreadPoolExecutor(max_workers=max(concurrency, 1))
+                    pending.extend(
+                        executor.submit(get_page, page, page_params) for page in pages
+                    )
+                    responses: Iterator[requests.Response] = _iter_results(pending)
+                else:
+                    responses = map(get_page, pages, [page_params])
+                batch_params, page_params = page_params, None
+                next_page = None
+                page_query: Dict[str, List[str]] = {}
+                for index, resp in enumerate(responses):
+                    page_data = self._get_page_data(
+                        resp, list_name, limit - len(data) if limit else 0
+                    )
+                    data.extend(page_data)
+
+                    next_page = self._get_page_path(
+                        resp.links.get("next", {}).get("url")
+                    )
+                    if not page_data or not next_page:
+                        next_page = None
+                        break
+                    if limit != 0 and len(data) >= limit:
+                        next_page = None
+                        break
+                    page_query = self._get_page_query(pages[index], batch_params)
+                    if index + 1 < len(pages) and not self._is_same_page(
+                        next_page, pages[index + 1]
+                    ):
+                        # The registry doesn't paginate as predicted, the rest
+                        # of the pages are fetched one by one from the real link
+                        predictable = False
+                        break
+                _discard_results(pending)
+
+                pages = []
+                if next_page:
+                    if predictable:
+                        pages = self._get_following_pages(
+                            next_page, concurrency, page_query
+                        )
+                    pages = pages or [next_page]
+        finally:
+            _discard_results(pending)
+            if executor is not None:
+                executor.shutdown()
+
+        return data
 
     def get_manifest_raw(
         self, repository: str, reference: str, manifest_types: Any = None
@@ -343,13 +918,177 @@ class ContainerRegistry:
         Returns:
             Any: Manifest raw http response object
         """
-        if not manifest_types:
-            manifest_types = ["docker_manifest_v2", "oci_manifest"]
+        accept_header = get_accept_header(manifest_types)
+        cached_response = self._get_cached_manifest(
+            (repository, reference, accept_header)
+        )
+        if cached_response is not None:
+            return cached_response
 
-        accept_header = ", ".join([ACCEPT_HEADERS[type] for type in manifest_types])
         headers = {"Accept": accept_header}
         uri = f"v2/{repository}/manifests/{reference}"
-        return self.get_request(uri, headers=headers)
+        resp = self.get_request(uri, headers=headers)
+        self._cache_manifest(repository, reference, accept_header, resp)
+        return resp
+
+    def _get_cached_manifest(
+        self, key: Tuple[str, str, str]
+    ) -> Optional[requests.Response]:
+        """
+        Get a manifest response from the cache.
+
+        Args:
+            key (Tuple[str, str, str]): Repository, reference and accept header
+
+        Returns:
+            Optional[requests.Response]: Cached response if available and not expired
+        """
+        with self._manifest_cache_lock:
+            entry = self._manifest_cache.get(key)
+            if entry is None:
+                return None
+            timestamp, resp = entry
+            if time.monotonic() - timestamp > self.MANIFEST_CACHE_TTL:
+                del self._manifest_cache[key]
+                return None
+            self._manifest_cache.move_to_end(key)
+            return resp
+
+    def _cache_manifest(
+        self,
+        repository: str,
+        reference: str,
+        accept_header: str,
+        resp: requests.Response,
+    ) -> None:
+        """
+        Store a successful manifest response in the cache. The response is
+        stored under the given reference and also under the manifest digest
+        so a subsequent lookup by digest doesn't hit the registry.
+
+        Args:
+            repository (str): Repository name
+            reference (str): Manifest digest or tag
+            accept_header (str): Accept header used in the request
+            resp (requests.Response): Manifest response
+        """
+        if self.MANIFEST_CACHE_SIZE <= 0 or resp.status_code != 200:
+            return
+        # Read the content so the response can be reused after the
+        # connection is released
+        # pylint: disable=W0104
+        resp.content
+
+        references = [reference]
+        digest = resp.headers.get("Docker-Content-Digest")
+        if digest and digest != reference:
+            references.append(digest)
+
+        timestamp = time.monotonic()
+        with self._manifest_cache_lock:
+            for ref in references:
+                key = (repository, ref, accept_header)
+                self._manifest_cache[key] = (timestamp, resp)
+                self._manifest_cache.move_to_end(key)
+            while len(self._manifest_cache) > self.MANIFEST_CACHE_SIZE:
+                self._manifest_cache.popitem(last=False)
+
+    def invalidate_manifest(self, repository: str, reference: str) -> None:
+        """
+        Remove cached manifest responses in a repository by a reference
+        (manifest digest or tag). Responses cached under the digest
+        of the removed manifest are removed as well.
+
+        Args:
+            repository (str): Repository name
+            reference (str): Manifest digest or tag
+        """
+        with self._manifest_cache_lock:
+            removed = [
+                resp
+                for key, (_, resp) in self._manifest_cache.items()
+                if key[:2] == (repository, reference)
+            ]
+            for key, (_, resp) in list(self._manifest_cache.items()):
+                if key[0] == repository and any(resp is r for r in removed):
+                    del self._manifest_cache[key]
+
+    def get_manifests_batch(
+        self,
+        repository: str,
+        references: List[str],
+        manifest_types: Any = None,
+        max_workers: int = 16,
+    ) -> Dict[str, requests.Response]:
+        """
+        Get manifest raw responses for multiple references in a repository.
+        Manifests are fetched concurrently using the shared registry session.
+
+        Args:
+            repository (str): Repository name
+            references (List[str]): Manifest digests or tags
+            manifest_types (Optional, List[str]): What type of manifest
+                to get, i.e. index, manifest, ...
+            max_workers (int): Maximum number of concurrent requests
+
+        Returns:
+            Dict[str, requests.Response]: Manifest raw http response object
+                by reference. Unsuccessful responses are included as well.
+        """
+
+        def get_manifest_raw(reference: str) -> requests.Response:
+            try:
+                return self.get_manifest_raw(repository, reference, manifest_types)
+            except requests.HTTPError as exc:
+                return exc.response
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            responses = executor.map(get_manifest_raw, references)
+            return dict(zip(references, responses))
+
+    def get_digests(
+        self,
+        repository: str,
+        references: List[str],
+        manifest_types: Any = None,
+        max_workers: int = 16,
+    ) -> Dict[str, Optional[str]]:
+        """
+        Get manifest digests for multiple references (tags) in a repository.
+        The digests are read from headers of HEAD requests made concurrently,
+        so manifests themselves are not downloaded.
+
+        Args:
+            repository (str): Repository name
+            references (List[str]): Manifest digests or tags
+            manifest_types (Optional, List[str]): What type of manifest
+                to get, i.e. index, manifest, ...
+            max_workers (int): Maximum number of concurrent requests
+
+        Returns:
+            Dict[str, Optional[str]]: Manifest digest by reference. The digest
+                is None if the manifest doesn't exist.
+
+        Raises:
+            requests.HTTPError: If a digest request fails for other reason than
+                a missing manifest
+        """
+        headers = {"Accept": get_accept_header(manifest_types)}
+
+        def get_digest(reference: str) -> Optional[str]:
+            uri = f"v2/{repository}/manifests/{reference}"
+            try:
+                resp = self.head_request(uri, headers=headers)
+            except requests.HTTPError as exc:
+                # Other errors, e.g. auth failures or outages, are not hidden
+                # as missing manifests
+                if exc.response is not None and exc.response.status_code == 404:
+                    return None
+                raise
+            return resp.headers.get("Docker-Content-Digest")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(zip(references, executor.map(get_digest, references)))
 
     def get_manifest(
         self,
@@ -375,7 +1114,7 @@ class ContainerRegistry:
         rsp = self.get_manifest_raw(repository, reference, manifest_types)
         if is_headers:
             return rsp.headers
-        return rsp.json()
+        return utils.response_json(rsp)
 
     def get_manifest_headers(self, repository: str, reference: str) -> Any:
         """
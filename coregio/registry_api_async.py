@@ -0,0 +1,309 @@
+"""Asynchronous container registry API implementation."""
+
+# The async client intentionally mirrors the sync one
+# pylint: disable=duplicate-code
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Union
+
+import httpx
+
+from coregio import utils
+from coregio.registry_api import BaseContainerRegistry, get_accept_header
+from coregio.registry_auth_httpx import (
+    HTTPXBasicAuthWithB64,
+    HTTPXBearerAuth,
+    HTTPXOAuth2,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+# Registry uses different auth methods and we don't know which one to use until
+# we make a request. The methods are tried in the given order.
+AUTH_METHODS = (HTTPXBearerAuth, HTTPXOAuth2, HTTPXBasicAuthWithB64)
+
+
+class AsyncContainerRegistry(BaseContainerRegistry):
+    """
+    Class which calls container registry API asynchronously.
+
+    Requests are made by httpx.AsyncClient with HTTP/2 enabled so many
+    concurrent requests can share a single connection to the registry.
+    """
+
+    # Use a low connect timeout to fail early when trying to connect to an
+    # endpoint that is firewalled (dropping packets)
+    DEFAULT_TIMEOUT = httpx.Timeout(15.0, connect=7.0)
+    DEFAULT_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+
+    # Maximum number of concurrent requests made by gather_manifests
+    MAX_CONCURRENT_REQUESTS = 50
+
+    def __init__(
+        self,
+        url: str,
+        docker_cfg: Optional[Union[str, Dict[str, Any]]] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        proxy: Optional[str] = None,
+    ) -> None:
+        """
+        Args:
+        url (str): URL of the registry to auth to
+        docker_cfg (Optional, Union[str, Dict[str, Any]]): DockerConfigJson
+            string or already parsed DockerConfigJson
+        client (Optional, httpx.AsyncClient): Client used for requests
+        proxy (Optional, str): Proxy URL used for https requests
+        """
+        super().__init__(url, docker_cfg=docker_cfg, proxy=proxy)
+
+        self.client = client or self._create_client()
+
+        self.auth_header: Optional[str] = None
+        self._auth_cache: Dict[Any, httpx.Auth] = {}
+
+    def _create_client(self) -> httpx.AsyncClient:
+        """
+        Create a HTTP/2 client with a proxy if set.
+
+        Returns:
+            httpx.AsyncClient: Registry client
+        """
+        mounts = None
+        if self.proxy:
+            mounts = {
+                "https://": httpx.AsyncHTTPTransport(
+                    http2=True, limits=self.DEFAULT_LIMITS, proxy=self.proxy
+                )
+            }
+        return httpx.AsyncClient(
+            http2=True,
+            limits=self.DEFAULT_LIMITS,
+            timeout=self.DEFAULT_TIMEOUT,
+            mounts=mounts,
+        )
+
+    async def close(self) -> None:
+        """Close the registry client."""
+        await self.client.aclose()
+
+    async def __aenter__(self) -> "AsyncContainerRegistry":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.close()
+
+    def _get_auth(self, auth_class: Any) -> httpx.Auth:
+        """
+        Get an auth object of a given class. The object is created using
+        the Docker config json auth token and it is cached for subsequent calls.
+
+        Args:
+            auth_class (Any): Auth class
+
+        Returns:
+            httpx.Auth: Auth object
+        """
+        if auth_class not in self._auth_cache:
+            self._auth_cache[auth_class] = auth_class(self._get_auth_token())
+        return self._auth_cache[auth_class]
+
+    async def _get(
+        self,
+        full_url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, Any]] = None,
+    ) -> httpx.Response:
+        """
+        Make a HTTP GET request to url given by the arguments and use
+        multiple auth method as a failover.
+
+        Args:
+            full_url (str): Full URL for the request
+            params (Optional[Dict[str, Any]], optional): Optional request params.
+                Defaults to None.
+            headers (Optional[Dict[str, Any]], optional): Optional request headers.
+                Defaults to None.
+
+        Returns:
+            httpx.Response: HTTP response object
+        """
+        for auth_method in AUTH_METHODS:
+            auth = self._get_auth(auth_method)
+            resp = await self.client.get(
+                full_url, params=params, headers=headers, auth=auth
+            )
+
+            self.auth_header = getattr(auth, "auth_header", None)
+            if resp.status_code != 401:
+                return resp
+            LOGGER.debug(
+                "Auth method %s was un-successful. Trying another one. %s",
+                auth_method,
+                full_url,
+            )
+
+        return resp
+
+    async def get_request(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, Any]] = None,
+    ) -> httpx.Response:
+        """
+        GET Registry API request to given uri
+
+        Args:
+            path: Registry API endpoint path
+            params: Params to pass to Registry API endpoint
+            headers: Headers to pass to Registry API endpoint
+
+        Returns:
+            httpx.Response: The resulting Response object
+
+        Raises:
+            httpx.HTTPStatusError: Unsuccessful response
+        """
+        full_url = self._get_full_url(path)
+
+        LOGGER.debug("Querying registry: GET %s %s %s", full_url, headers, params)
+        resp = await self._get(full_url, params=params, headers=headers)
+        utils.handle_response(resp)
+        resp.raise_for_status()
+
+        LOGGER.debug(
+            "Registry GET query was successful - %s - %s", full_url, resp.status_code
+        )
+        return resp
+
+    async def get_paginated_response(  # pylint: disable=too-many-arguments
+        self,
+        path: str,
+        list_name: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, Any]] = None,
+        page_size: int = 100,
+        limit: int = 0,
+    ) -> List[Any]:
+        """
+        Get Registry API paginated response. This only applies to responses with lists.
+
+        Args:
+            path (str): API endpoint path
+            list_name (str): Name that points to the list of data in the response,
+                             e.g. tags
+            params (Optional[Dict[str, Any]]): Request params
+            headers (Optional[Dict[str, Any]]): Request headers
+            page_size (int): The number of records per page
+            limit (int): Maximum limit of records
+
+        Returns:
+            Any: Data returned by iterating over all available pages
+        """
+        data: List[Any] = []
+        next_page: Optional[str] = path
+        page_params: Optional[Dict[str, Any]] = {**(params or {}), "n": page_size}
+        while next_page:
+            resp = await self.get_request(
+                next_page, headers=headers, params=page_params
+            )
+            data.extend(utils.response_json(resp).get(list_name, []))
+            if limit != 0 and len(data) >= limit:
+                break
+
+            # The next page link already contains all the params
+            next_page = resp.links.get("next", {}).get("url")
+            page_params = None
+
+        return data[:limit] if limit else data
+
+    async def get_manifest_raw(
+        self, repository: str, reference: str, manifest_types: Any = None
+    ) -> httpx.Response:
+        """
+        Get manifest raw response in a repository by a reference
+        (manifest digest or tag).
+
+        Args:
+            repository (str): Repository name
+            reference (str): Manifest digest or tag
+            manifest_types (Optional, List[str]): What type of manifest
+                to get, i.e. index, manifest, ...
+
+        Returns:
+            httpx.Response: Manifest raw http response object
+        """
+        headers = {"Accept": get_accept_header(manifest_types)}
+        uri = f"v2/{repository}/manifests/{reference}"
+        return await self.get_request(uri, headers=headers)
+
+    async def get_manifest(
+        self,
+        repository: str,
+        reference: str,
+        manifest_types: Any = None,
+        is_headers: bool = False,
+    ) -> Any:
+        """
+        Get manifest in a repository by a reference (manifest digest or tag).
+
+        Args:
+            repository (str): Repository name
+            reference (str): Manifest digest or tag
+            manifest_types (Optional, List[str]): What type of manifest
+                to get, i.e. index, manifest, ...
+            is_headers (bool): Indicates if headers need to be returned or response data
+
+        Returns:
+            dict: Manifest in the given repository or headers of the response
+                (depends on value of is_headers parameter)
+        """
+        rsp = await self.get_manifest_raw(repository, reference, manifest_types)
+        if is_headers:
+            return rsp.headers
+        return utils.response_json(rsp)
+
+    async def gather_manifests(
+        self, repository: str, references: List[str], manifest_types: Any = None
+    ) -> Dict[str, Any]:
+        """
+        Get manifests for multiple references in a repository concurrently.
+        The number of concurrent requests is limited by MAX_CONCURRENT_REQUESTS.
+
+        Args:
+            repository (str): Repository name
+            references (List[str]): Manifest digests or tags
+            manifest_types (Optional, List[str]): What type of manifest
+                to get, i.e. index, manifest, ...
+
+        Returns:
+            Dict[str, Any]: Manifests by reference
+        """
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_REQUESTS)
+
+        async def get_manifest(reference: str) -> Any:
+            async with semaphore:
+                return await self.get_manifest(repository, reference, manifest_types)
+
+        manifests = await asyncio.gather(*map(get_manifest, references))
+        return dict(zip(references, manifests))
+
+    async def get_tags(
+        self, repository: str, page_size: int = 100, limit: int = 2000
+    ) -> Any:
+        """
+        Get all tags in a repository.
+
+        Args:
+            repository (str): Repository name
+            page_size (int, optional): The number of tags per page; defaults to 100
+            limit (int, optional): Maximum total number of tags
+                to be retrieved; defaults to 2000
+
+        Returns:
+            list: Tags in the repository
+        """
+        uri = f"v2/{repository}/tags/list"
+        return await self.get_paginated_response(
+            uri, list_name="tags", page_size=page_size, limit=limit
+        )
@@ -9,10 +9,18 @@ of the BSD license. See the LICENSE file for details.
 
 from __future__ import absolute_import, unicode_literals
 
+import base64
+import functools
+import hashlib
 import json
 import logging
+import os
 import re
-from typing import Any, Optional
+import tempfile
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from typing import Any, Dict, Optional, Tuple
 from urllib.parse import urlparse
 
 import requests
@@ -22,32 +30,329 @@ from requests.utils import parse_dict_header
 
 DEFAULT_TIMEOUT = (7.0, 15.0)
 
+# Session shared by all token requests, so connections to the token realm
+# are reused instead of doing a new TLS handshake for every token. Cookies
+# are rejected so nothing leaks between requests made with different
+# credentials, the same as with one-off requests.
+_REALM_SESSION = requests.Session()
+_REALM_SESSION.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+# Tokens issued by token realms by (realm, scope, credentials hash). Tokens
+# are shared by all auth objects in the process until they expire.
+_REALM_CACHE: Dict[Tuple[str, str, str], Tuple[str, float]] = {}
+_REALM_CACHE_LOCK = threading.Lock()
+REALM_CACHE_SIZE = 1024
+
 # This module comes from atomic-reactor
 # https://github.com/containerbuildsystem/atomic-reactor/blob/1.6.41/atomic_reactor/auth.py
 
 LOG = logging.getLogger(__name__)
 
+# Validates a Bearer WWW-Authenticate challenge and captures its parameters
+_BEARER_PREFIX = re.compile(r"\s*bearer\s+(.*)", re.IGNORECASE | re.DOTALL)
+
+V2_REPO_PATTERN = re.compile(r"^/v2/(.*)/(manifests|tags|blobs)/")
+
+
+@functools.lru_cache(maxsize=64)
+def _parse_bearer_challenge(auth_info: str) -> Dict[str, Any]:
+    """
+    Parse parameters of a Bearer WWW-Authenticate challenge. Registries send
+    the same challenge to every request lacking a token for a repository, or
+    for the whole registry if the challenge doesn't include a scope, so the
+    result is cached.
+
+    example: realm="url",service="test.azurecr.io"
+    -> {"realm": "url", "service": "test.azurecr.io"}
+
+    Args:
+        auth_info (str): Challenge parameters without the Bearer scheme
+
+    Returns:
+        Dict[str, Any]: Challenge parameters, the dict must not be modified
+    """
+    return parse_dict_header(auth_info)
+
+
+def parse_bearer_challenge(auth_info: str) -> Dict[str, Any]:
+    """
+    Parse parameters of a Bearer WWW-Authenticate challenge.
+
+    Args:
+        auth_info (str): Challenge parameters without the Bearer scheme
+
+    Returns:
+        Dict[str, Any]: Challenge parameters
+    """
+    return _parse_bearer_challenge(auth_info).copy()
+
+
+def _extract_repo(path: str) -> Optional[str]:
+    """
+    Extract a repository name from a registry API v2 path.
+
+    example: /v2/ns/repo/manifests/latest -> ns/repo
+
+    Args:
+        path (str): URL path
+
+    Returns:
+        Optional[str]: Repository name if the path belongs to a repository
+    """
+    v2_match = V2_REPO_PATTERN.match(path)
+    return v2_match.group(1) if v2_match else None
+
+
+def _get_token_expiration(token: str, default_expires_in: float) -> float:
+    """
+    Get an expiration time of a token. The expiration is read from the "exp"
+    claim if the token is a JWT, otherwise a default expiration is used.
+
+    Args:
+        token (str): Bearer token
+        default_expires_in (float): Token lifetime in seconds if the expiration
+            can't be determined from the token
+
+    Returns:
+        float: Expiration time as a unix timestamp
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return time.time() + default_expires_in
+
+
+def _get_realm_token(key: Tuple[str, str, str]) -> Optional[str]:
+    """
+    Get a token issued by a token realm from the in-memory cache.
+
+    Args:
+        key (Tuple[str, str, str]): Realm, scope and credentials hash
+
+    Returns:
+        Optional[str]: Token if cached and not expired
+    """
+    with _REALM_CACHE_LOCK:
+        entry = _REALM_CACHE.get(key)
+    if entry is None or entry[1] <= time.monotonic():
+        return None
+    return entry[0]
+
+
+def _set_realm_token(key: Tuple[str, str, str], token: str, max_ttl: float) -> None:
+    """
+    Store a token issued by a token realm in the in-memory cache. The token
+    is cached until it expires but at most for max_ttl seconds.
+    See DiskTokenCache for the expiration of tokens that are not JWTs.
+
+    Args:
+        key (Tuple[str, str, str]): Realm, scope and credentials hash
+        token (str): Token issued by the realm
+        max_ttl (float): Maximum number of seconds the token is cached
+    """
+    ttl = min(
+        max_ttl,
+        _get_token_expiration(token, DiskTokenCache.DEFAULT_EXPIRES_IN)
+        - time.time()
+        - DiskTokenCache.EXPIRATION_MARGIN,
+    )
+    if ttl <= 0:
+        return
+
+    now = time.monotonic()
+    with _REALM_CACHE_LOCK:
+        if key not in _REALM_CACHE and len(_REALM_CACHE) >= REALM_CACHE_SIZE:
+            for expired_key in [
+                cached_key
+                for cached_key, (_, expires_at) in _REALM_CACHE.items()
+                if expires_at <= now
+            ]:
+                del _REALM_CACHE[expired_key]
+            if len(_REALM_CACHE) >= REALM_CACHE_SIZE:
+                # Drop the oldest token
+                del _REALM_CACHE[next(iter(_REALM_CACHE))]
+        _REALM_CACHE[key] = (token, now + ttl)
+
+
+class DiskTokenCache:
+    """
+    Bearer token cache persisted in a JSON file.
+
+    Tokens survive process restarts so short-lived processes don't need to go
+    through the token challenge for every repository again. Tokens are stored
+    with their expiration time and expired tokens are ignored.
+    """
+
+    # Token lifetime used when the expiration can't be read from the token
+    # https://docs.docker.com/registry/spec/auth/token/#token-response-fields
+    DEFAULT_EXPIRES_IN = 60
+    # Tokens expiring in less than given number of seconds are not used
+    EXPIRATION_MARGIN = 10
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        """Initialize DiskTokenCache object.
+
+        :param path: str, path to the cache file; defaults to
+            $XDG_CACHE_HOME/coregio/tokens.json
+        """
+        if path is None:
+            cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+                os.path.expanduser("~"), ".cache"
+            )
+            path = os.path.join(cache_dir, "coregio", "tokens.json")
+        self.path = path
+        self._lock = threading.Lock()
+        # Parsed cache file with the file status it was read with. The file
+        # is read again only when it changes, not for every request.
+        self._loaded: Tuple[Optional[Tuple[int, int, int]], Dict[str, Any]] = (
+            None,
+            {},
+        )
 
+    def get(self, key: str) -> Optional[str]:
+        """
+        Get a valid token from the cache.
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            Optional[str]: Token if available and not expired
+        """
+        entry = self._load().get(key)
+        if not isinstance(entry, dict):
+            return None
+        if entry.get("exp", 0) - self.EXPIRATION_MARGIN <= time.time():
+            return None
+        return entry.get("token")
+
+    def set(self, key: str, token: str) -> None:
+        """
+        Store a token in the cache. Expired tokens are removed from the cache.
+
+        Args:
+            key (str): Cache key
+            token (str): Bearer token
+        """
+        now = time.time()
+        with self._lock:
+            tokens = {
+                cache_key: entry
+                for cache_key, entry in self._load().items()
+                if isinstance(entry, dict) and entry.get("exp", 0) > now
+            }
+            tokens[key] = {
+                "token": token,
+                "exp": _get_token_expiration(token, self.DEFAULT_EXPIRES_IN),
+            }
+            self._save(tokens)
+
+    def _load(self) -> Dict[str, Any]:
+        # The returned dict is shared, it must not be modified
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return {}
+        # The file is replaced on save, so a new inode means new content even
+        # if the modification time doesn't change
+        file_status = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        loaded_status, tokens = self._loaded
+        if file_status == loaded_status:
+            return tokens
+
+        try:
+            with open(self.path, encoding="utf-8") as cache_file:
+                tokens = json.load(cache_file)
+        except (OSError, ValueError):
+            tokens = {}
+        if not isinstance(tokens, dict):
+            tokens = {}
+        self._loaded = (file_status, tokens)
+        return tokens
+
+    def _save(self, tokens: Dict[str, Any]) -> None:
+        # The cache is written to a temporary file (readable only by the user)
+        # and moved over the original one so readers never see a partial file
+        directory = os.path.dirname(self.path)
+        tmp_path = None
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            file_descriptor, tmp_path = tempfile.mkstemp(dir=directory)
+            with os.fdopen(file_descriptor, "w", encoding="utf-8") as cache_file:
+                json.dump(tokens, cache_file)
+            os.replace(tmp_path, self.path)
+            tmp_path = None
+        except OSError as exc:
+            LOG.warning("Failed to store token cache %s: %s", self.path, exc)
+        finally:
+            # The temporary file is left behind only if it couldn't be moved
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+
+
+# pylint: disable=too-many-instance-attributes
 class BearerAuthBase(AuthBase):
     """
     Base class for Bearer token authentication.
     """
 
-    BEARER_PATTERN = re.compile(r"bearer ", flags=re.IGNORECASE)
-    V2_REPO_PATTERN = re.compile(r"^/v2/(.*)/(manifests|tags|blobs)/")
-
-    def __init__(self, proxy: Optional[str] = None) -> None:
+    # Attributes are stored in slots for faster access, requests.auth.AuthBase
+    # doesn't define slots so instances still have __dict__
+    __slots__ = (
+        "token_cache",
+        "proxy",
+        "_proxies",
+        "disk_cache",
+        "last_auth_header",
+        "_last_bearer",
+        "_token_lock",
+        "_token_locks",
+    )
+
+    V2_REPO_PATTERN = V2_REPO_PATTERN
+
+    def __init__(
+        self, proxy: Optional[str] = None, disk_cache: Optional[DiskTokenCache] = None
+    ) -> None:
         """Initialize HTTPBearerAuth object."""
         self.token_cache = {}
         self.proxy = proxy
+        # Proxies used for token requests, the proxy can't change
+        self._proxies = {"https": proxy} if proxy else None
+        self.disk_cache = disk_cache
 
-        self.last_auth_header = None
+        self.last_auth_header: Optional[str] = None
+        # (token, header) of the last used token
+        self._last_bearer: Tuple[Optional[str], Optional[str]] = (None, None)
 
-    def __call__(self, response: Any) -> Any:
-        repo = self._get_repo_from_url(response.url)
+        # The auth object may be shared by multiple threads. Tokens are read
+        # without a lock, a lock per repository prevents concurrent fetching
+        # of the same token while tokens for other repositories are fetched
+        # in parallel. The main lock guards only the per-repository locks.
+        self._token_lock = threading.Lock()
+        self._token_locks: Dict[Optional[str], threading.Lock] = {}
 
-        if repo in self.token_cache:
-            self._set_header(response, repo)
+    def __call__(self, response: Any) -> Any:
+        path = self._get_path(response.url)
+        repo = _extract_repo(path)
+
+        token = self.token_cache.get(repo)
+        if token is None and self.disk_cache is not None:
+            token = self.disk_cache.get(self._get_cache_key(response.url, repo))
+            if token:
+                self.token_cache[repo] = token
+
+        if token is not None:
+            # The hook refreshes the token if the registry rejects it,
+            # e.g. once it expires
+            self._set_header(response, token)
+        elif not path.startswith("/v2/") and not self._has_credentials():
+            # Requests outside the registry API don't need an anonymous token
             return response
 
         def handle_401_with_repo(resp: Any, **kwargs):  # pragma: no cover
@@ -61,12 +366,28 @@ class BearerAuthBase(AuthBase):
         if response.status_code != 401:
             return response
 
-        auth_info = response.headers.get("www-authenticate", "")
-
-        if "bearer" not in auth_info.lower():
+        bearer_match = _BEARER_PREFIX.match(
+            response.headers.get("www-authenticate", "")
+        )
+        if not bearer_match:
             return response
-
-        self.token_cache[repo] = self._get_token(auth_info, repo)
+        auth_info = bearer_match.group(1)
+
+        failed_auth_header = response.request.headers.get("Authorization")
+        with self._get_token_lock(repo):
+            token = self.token_cache.get(repo)
+            # Another thread might have fetched a new token while this one was
+            # waiting for the lock. The token is fetched only if there is none
+            # or if it was the one rejected by the registry.
+            if token is None or f"Bearer {token}" == failed_auth_header:
+                token = self._get_token(auth_info, repo)
+                if not token:
+                    # Retrying the request without a token would fail the same way
+                    self.token_cache.pop(repo, None)
+                    return response
+                self.token_cache[repo] = token
+                if self.disk_cache is not None:
+                    self.disk_cache.set(self._get_cache_key(response.url, repo), token)
 
         # Consume content and release the original connection
         # to allow our new request to reuse the same one.
@@ -80,13 +401,29 @@ class BearerAuthBase(AuthBase):
         extract_cookies_to_jar(retry_request._cookies, response.request, response.raw)
         retry_request.prepare_cookies(retry_request._cookies)
 
-        self._set_header(retry_request, repo)
+        self._set_header(retry_request, token)
         retry_response = response.connection.send(retry_request, **kwargs)
         retry_response.history.append(response)
         retry_response.request = retry_request
 
         return retry_response
 
+    def _get_token_lock(self, repo: Optional[str]) -> threading.Lock:
+        """
+        Get a lock preventing concurrent fetching of a token for a repository.
+
+        Args:
+            repo (Optional[str]): Repository name
+
+        Returns:
+            threading.Lock: Lock of the repository
+        """
+        with self._token_lock:
+            lock = self._token_locks.get(repo)
+            if lock is None:
+                lock = self._token_locks[repo] = threading.Lock()
+            return lock
+
     @property
     def auth_header(self) -> Optional[str]:
         """
@@ -97,17 +434,50 @@ class BearerAuthBase(AuthBase):
         """
         return self.last_auth_header
 
-    def _set_header(self, response: Any, repo: str) -> None:
-        self.last_auth_header = f"Bearer {self.token_cache[repo]}"
-        response.headers["Authorization"] = self.last_auth_header
+    def _set_header(self, response: Any, token: str) -> None:
+        # The same token is usually used for many requests in a row
+        last_token, header = self._last_bearer
+        if token is not last_token:
+            header = f"Bearer {token}"
+            self._last_bearer = (token, header)
+        self.last_auth_header = header
+        response.headers["Authorization"] = header
+
+    @staticmethod
+    def _get_path(url: str) -> str:
+        # A path doesn't need to be parsed
+        return url if url.startswith("/v2/") else urlparse(url).path
+
+    @classmethod
+    def _get_repo_from_url(cls, url: str) -> Optional[str]:
+        return _extract_repo(cls._get_path(url))
+
+    def _get_cache_key(self, url: str, repo: Optional[str]) -> str:
+        """
+        Get a key identifying a token in the disk cache. Tokens are specific
+        to the registry, repository and credentials used to obtain them.
+        Credentials are hashed so they are not exposed in the cache.
+        """
+        return ":".join(
+            (
+                type(self).__name__,
+                urlparse(url).netloc,
+                repo or "",
+                self._get_credentials_hash(),
+            )
+        )
+
+    def _get_credentials_hash(self) -> str:
+        """Hash of the credentials used to obtain a token."""
+        return hashlib.sha256(self._get_credentials().encode()).hexdigest()
 
-    def _get_repo_from_url(self, url: str) -> Optional[str]:
-        url_parts = urlparse(url)
-        repo = None
-        v2_match = self.V2_REPO_PATTERN.search(url_parts.path)
-        if v2_match:
-            repo = v2_match.group(1)
-        return repo
+    def _get_credentials(self) -> str:
+        """Credentials used to obtain a token."""
+        return ""
+
+    def _has_credentials(self) -> bool:
+        """Whether a token is obtained with credentials or anonymously."""
+        return False
 
     def _get_token(
         self, auth_info: str, repo: str
@@ -134,6 +504,12 @@ class HTTPBearerAuth(BearerAuthBase):  # pragma: no cover
     Supports registry v2 API only.
     """
 
+    __slots__ = ("auth_b64", "verify", "access", "_access_scope")
+
+    # Tokens issued by a realm are shared by all HTTPBearerAuth objects
+    # in the process for at most given number of seconds, 0 disables sharing
+    REALM_CACHE_TTL = 120.0
+
     def __init__(self, auth_b64, *args, verify=True, access=None, **kwargs):
         """Initialize HTTPBearerAuth object.
 
@@ -147,28 +523,46 @@ class HTTPBearerAuth(BearerAuthBase):  # pragma: no cover
         self.auth_b64 = auth_b64
         self.verify = verify
         self.access = access or ("pull",)
+        self._access_scope = ",".join(self.access)
 
         super().__init__(*args, **kwargs)
 
+    def _get_credentials(self) -> str:
+        return f"{self.auth_b64 or ''}:{self._access_scope}"
+
+    def _has_credentials(self) -> bool:
+        return bool(self.auth_b64)
+
     def _get_token(self, auth_info: str, repo: str) -> Optional[str]:
-        bearer_info = parse_dict_header(self.BEARER_PATTERN.sub("", auth_info, count=1))
+        bearer_info = parse_bearer_challenge(auth_info)
         # If repo could not be determined, do not set scope - implies
         # global access
         if repo:
-            bearer_info["scope"] = f"repository:{repo}:{','.join(self.access)}"
+            bearer_info["scope"] = f"repository:{repo}:{self._access_scope}"
         realm = bearer_info.pop("realm")
 
+        cache_key = (
+            realm,
+            bearer_info.get("scope", ""),
+            self._get_credentials_hash(),
+        )
+        if self.REALM_CACHE_TTL > 0:
+            token = _get_realm_token(cache_key)
+            # A token rejected by the registry is not used again
+            if token is not None and token != self.token_cache.get(repo):
+                return token
+
         realm_auth = None
         if self.auth_b64:
             realm_auth = HTTPBasicAuthWithB64(self.auth_b64)
 
-        realm_response = requests.get(
+        realm_response = _REALM_SESSION.get(
             realm,
             params=bearer_info,
             verify=self.verify,
             auth=realm_auth,
             timeout=DEFAULT_TIMEOUT,
-            proxies={"https": self.proxy} if self.proxy else None,
+            proxies=self._proxies,
         )
         if realm_response.status_code != 200:
             LOG.info(
@@ -182,12 +576,13 @@ class HTTPBearerAuth(BearerAuthBase):  # pragma: no cover
         response = realm_response.json()
 
         # Based on https://docs.docker.com/registry/spec/auth/token/#requesting-a-token
-        # there can be a multiple fields with token - lets iterate over them and
-        # return the first one we find
-        for token_keys in ("token", "access_token"):
-            if token_keys in response:
-                return response[token_keys]
-        return None
+        # the token can be in the "token" or "access_token" field - the first
+        # one found is used
+        token = response.get("token") or response.get("access_token")
+
+        if token and self.REALM_CACHE_TTL > 0:
+            _set_realm_token(cache_key, token, self.REALM_CACHE_TTL)
+        return token
 
 
 # pylint: disable=too-few-public-methods
@@ -202,22 +597,31 @@ class HTTPOAuth2(BearerAuthBase):  # pragma: no cover
     Supports registry v2 API only.
     """
 
+    __slots__ = ("refresh_token", "_identity_token")
+
     def __init__(self, refresh_token: str, *args, **kwargs) -> None:
         """Initialize HTTPOAuth2 object.
 
         :param refresh_token: str, identity_token from dockerconfig.json
         """
         self.refresh_token = refresh_token
+        # The refresh token may be rotated by the registry, keep the original
+        # one to identify tokens in the disk cache
+        self._identity_token = refresh_token
         super().__init__(*args, **kwargs)
 
+    def _get_credentials(self) -> str:
+        return self._identity_token or ""
+
+    def _has_credentials(self) -> bool:
+        return bool(self._identity_token)
+
     def _get_token(self, auth_info: str, repo: str) -> Optional[str]:
         """
         Acquires a Bearer token from the registry using OAuth2 flow.
         """
         # convert WWW-Authenticate header into a dict
-        # example: Bearer ream="url",service="test.azurecr.io"
-        # -> {"realm": "url", "service": "test.azurecr.io"}
-        bearer_info = parse_dict_header(self.BEARER_PATTERN.sub("", auth_info, count=1))
+        bearer_info = parse_bearer_challenge(auth_info)
 
         params = {
             "service": bearer_info.get("service"),
@@ -231,14 +635,14 @@ class HTTPOAuth2(BearerAuthBase):  # pragma: no cover
             params["scope"] = f"repository:{repo}:pull"
 
         # make the request to the registry
-        url = bearer_info.get("realm")
-        realm_response = requests.post(
+        url = bearer_info.get("realm", "")
+        realm_response = _REALM_SESSION.post(
             url,
             data=params,
             verify=True,
             headers={"Content-Type": "application/x-www-form-urlencoded"},
             timeout=DEFAULT_TIMEOUT,
-            proxies={"https": self.proxy} if self.proxy else None,
+            proxies=self._proxies,
         )
         if realm_response.status_code != 200:
             LOG.info(
@@ -271,6 +675,8 @@ class HTTPBasicAuthWithB64(AuthBase):
     it by receiving the base64 string.
     """
 
+    __slots__ = ("auth", "proxy", "last_auth_header")
+
     def __init__(self, auth, proxy: Optional[str] = None):
         """Initialize HTTPBasicAuthWithB64 object.
 
@@ -287,6 +693,6 @@ class HTTPBasicAuthWithB64(AuthBase):
         return self.last_auth_header
 
     def __call__(self, response):
-        response.headers["Authorization"] = self.auth_header
+        response.headers["Authorization"] = self.last_auth_header
 
         return response
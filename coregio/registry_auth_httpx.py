@@ -0,0 +1,218 @@
+"""
+Registry authentication for the httpx client.
+
+The auth classes follow the requests based ones in coregio.registry_auth.
+The token challenge is implemented using the httpx auth flow so the same
+classes work with both the sync and the async httpx client.
+"""
+
+# The auth classes intentionally mirror the requests based ones
+# pylint: disable=duplicate-code
+import json
+import logging
+from typing import Any, Dict, Generator, Optional
+
+import httpx
+
+from coregio.registry_auth import _BEARER_PREFIX, _extract_repo, parse_bearer_challenge
+
+LOG = logging.getLogger(__name__)
+
+AuthFlow = Generator[httpx.Request, httpx.Response, None]
+
+
+class HTTPXBearerAuthBase(httpx.Auth):
+    """
+    Base class for Bearer token authentication.
+
+    Once Bearer token is retrieved, it will be cached and used in subsequent
+    requests. Since tokens are specific to repositories, the token cache may
+    store multiple tokens.
+    """
+
+    requires_response_body = True
+
+    def __init__(self) -> None:
+        """Initialize HTTPXBearerAuthBase object."""
+        self.token_cache: Dict[Optional[str], str] = {}
+        self.last_auth_header: Optional[str] = None
+
+    @property
+    def auth_header(self) -> Optional[str]:
+        """
+        Auth header used in the last request.
+
+        Returns:
+            Optional[str]: Auth header used in the last request.
+        """
+        return self.last_auth_header
+
+    def auth_flow(self, request: httpx.Request) -> AuthFlow:
+        repo = self._get_repo_from_url(request.url.path)
+
+        if repo in self.token_cache:
+            self._set_header(request, repo)
+
+        response = yield request
+        if response.status_code != 401:
+            return
+
+        bearer_match = _BEARER_PREFIX.match(
+            response.headers.get("www-authenticate", "")
+        )
+        if not bearer_match:
+            return
+
+        # A cached token was rejected, e.g. once it expired, a new one is fetched
+        self.token_cache.pop(repo, None)
+        bearer_info = parse_bearer_challenge(bearer_match.group(1))
+        token_response = yield self._build_token_request(bearer_info, repo)
+        token = self._get_token(token_response)
+        if token is not None:
+            self.token_cache[repo] = token
+            self._set_header(request, repo)
+        # The flow results in the last response received, so the request is
+        # sent again even without a token to return the registry response
+        # instead of the token one
+        yield request
+
+    def _set_header(self, request: httpx.Request, repo: Optional[str]) -> None:
+        self.last_auth_header = f"Bearer {self.token_cache[repo]}"
+        request.headers["Authorization"] = self.last_auth_header
+
+    @staticmethod
+    def _get_repo_from_url(path: str) -> Optional[str]:
+        return _extract_repo(path)
+
+    def _build_token_request(
+        self, bearer_info: Dict[str, Any], repo: Optional[str]
+    ) -> httpx.Request:  # pragma: no cover
+        raise NotImplementedError()
+
+    def _get_token(self, response: httpx.Response) -> Optional[str]:
+        if response.status_code != 200:
+            LOG.info(
+                "Registry challenge %s responded with %d - %s",
+                response.url,
+                response.status_code,
+                response.text,
+            )
+            return None
+        try:
+            return self._get_token_from_json(response.json())
+        except (json.decoder.JSONDecodeError, KeyError, TypeError):
+            LOG.info("Registry %s did not return bearer token", response.url)
+        return None
+
+    def _get_token_from_json(
+        self, response: Dict[str, Any]
+    ) -> Optional[str]:  # pragma: no cover
+        raise NotImplementedError()
+
+
+class HTTPXBearerAuth(HTTPXBearerAuthBase):
+    """
+    Performs Bearer authentication for the given Request object.
+
+    auth_b64 is optional. If provided, it will be used when fetching the Bearer
+    token from realm. Otherwise, Bearer token is retrieved with anonymous access.
+
+    Supports registry v2 API only.
+    """
+
+    def __init__(self, auth_b64: Optional[str], access: Any = None) -> None:
+        """Initialize HTTPXBearerAuth object.
+
+        :param auth_b64: str, base64 credentials as described in RFC 7617
+        :param access: iter<str>, iterable (list, tuple, etc) of access to be
+            requested; possible values to be included are 'pull' and/or 'push';
+            defaults to ('pull',)
+        """
+        self.auth_b64 = auth_b64
+        self.access = access or ("pull",)
+        self._access_scope = ",".join(self.access)
+        super().__init__()
+
+    def _build_token_request(
+        self, bearer_info: Dict[str, Any], repo: Optional[str]
+    ) -> httpx.Request:
+        # If repo could not be determined, do not set scope - implies
+        # global access
+        if repo:
+            bearer_info["scope"] = f"repository:{repo}:{self._access_scope}"
+        realm = bearer_info.pop("realm")
+
+        headers = {}
+        if self.auth_b64:
+            headers["Authorization"] = f"Basic {self.auth_b64}"
+        return httpx.Request("GET", realm, params=bearer_info, headers=headers)
+
+    def _get_token_from_json(self, response: Dict[str, Any]) -> Optional[str]:
+        # Based on https://docs.docker.com/registry/spec/auth/token/#requesting-a-token
+        # the token can be in the "token" or "access_token" field - the first
+        # one found is used
+        return response.get("token") or response.get("access_token")
+
+
+class HTTPXOAuth2(HTTPXBearerAuthBase):
+    """
+    Performs OAuth2 authentication for the given Request object.
+
+    Supports registry v2 API only.
+    """
+
+    def __init__(self, refresh_token: Optional[str]) -> None:
+        """Initialize HTTPXOAuth2 object.
+
+        :param refresh_token: str, identity_token from dockerconfig.json
+        """
+        self.refresh_token = refresh_token
+        super().__init__()
+
+    def _build_token_request(
+        self, bearer_info: Dict[str, Any], repo: Optional[str]
+    ) -> httpx.Request:
+        params = {
+            "service": bearer_info.get("service"),
+            "grant_type": "refresh_token",
+            "refresh_token": self.refresh_token,
+            "client_id": "mercury",
+        }
+        # If repo could not be determined, do not set scope -> implies global access
+        if repo:
+            params["scope"] = f"repository:{repo}:pull"
+
+        return httpx.Request("POST", bearer_info.get("realm", ""), data=params)
+
+    def _get_token_from_json(self, response: Dict[str, Any]) -> Optional[str]:
+        # Based on https://docs.docker.com/registry/spec/auth/oauth/#response-fields
+        # response contains access_token and optionally additional refresh_token
+        if response.get("refresh_token"):
+            self.refresh_token = response.get("refresh_token")
+        return response["access_token"]
+
+
+class HTTPXBasicAuthWithB64(httpx.Auth):
+    """Performs Basic authentication for the given Request object.
+
+    As in httpx.BasicAuth, but instead of converting 'username:password'
+    to a base64 string (as per RFC 7617), this class does it by receiving
+    the base64 string.
+    """
+
+    def __init__(self, auth: Optional[str]) -> None:
+        """Initialize HTTPXBasicAuthWithB64 object.
+
+        :param auth: str, base64 credentials as described in RFC 7617
+        """
+        self.auth = auth
+        self.last_auth_header = f"Basic {self.auth}"
+
+    @property
+    def auth_header(self) -> Optional[str]:
+        """Return the last auth header."""
+        return self.last_auth_header
+
+    def auth_flow(self, request: httpx.Request) -> AuthFlow:
+        request.headers["Authorization"] = self.last_auth_header
+        yield request
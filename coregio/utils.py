@@ -1,48 +1,76 @@
 """
 Utilities for http queries
 """
+import json
 import logging
 import re
-from typing import Any
+from typing import Any, Union
 
 from requests import Session
 from requests.adapters import HTTPAdapter, Retry
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
 LOGGER = logging.getLogger(__name__)
 
+# Number of connections kept open per host. The urllib3 default (10) would
+# make concurrent requests beyond that wait for a free connection.
+DEFAULT_POOL_SIZE = 32
+
+DEFAULT_STATUS_FORCELIST = (408, 500, 502, 503, 504)
+
+# Retry objects are never modified by urllib3 (a new one is created for every
+# retry attempt), so the default one is shared by all sessions
+_DEFAULT_RETRY = Retry(
+    total=10,
+    backoff_factor=1,
+    status_forcelist=DEFAULT_STATUS_FORCELIST,
+    # Don't raise a MaxRetryError for codes in status_forcelist.
+    # This allows for more graceful exception handling using
+    # Response.raise_for_status.
+    raise_on_status=False,
+)
+
+# Maximum number of response body characters included in log messages
+MAX_LOGGED_BODY_SIZE = 512
+
+SCHEME_PATTERN = re.compile(r"^[A-Za-z0-9+.\-]+://")
+
 
 def handle_response(resp: Any) -> Any:
     """
     Handle and log API response
 
+    The response body is read only if the log message is going to be emitted
+    and it is truncated to MAX_LOGGED_BODY_SIZE characters.
+
     Args:
         resp (Any): API response
     """
     service_name = "Registry API"
     if 400 <= resp.status_code < 500:
-        LOGGER.warning(
-            "%s: Incomplete or incorrect data given to API: %s - %s",
-            service_name,
-            resp.status_code,
-            resp.text,
-            extra={"url": resp.url},
-        )
+        level = logging.WARNING
+        message = "%s: Incomplete or incorrect data given to API: %s - %s"
     elif 500 <= resp.status_code < 600:
-        LOGGER.error(
-            "%s: Unexpected API response: %s - %s",
-            service_name,
-            resp.status_code,
-            resp.text,
-            extra={"url": resp.url},
-        )
+        level = logging.ERROR
+        message = "%s: Unexpected API response: %s - %s"
     else:
-        LOGGER.debug(
-            "%s: Successful API request: %s - %s",
-            service_name,
-            resp.status_code,
-            resp.text,
-            extra={"url": resp.url},
-        )
+        level = logging.DEBUG
+        message = "%s: Successful API request: %s - %s"
+
+    if not LOGGER.isEnabledFor(level):
+        return
+    LOGGER.log(
+        level,
+        message,
+        service_name,
+        resp.status_code,
+        resp.text[:MAX_LOGGED_BODY_SIZE],
+        extra={"url": resp.url},
+    )
 
 
 def add_session_retries(
@@ -50,35 +78,105 @@ def add_session_retries(
     total: int = 10,
     backoff_factor: int = 1,
     status_forcelist: Any = None,
+    pool_size: int = DEFAULT_POOL_SIZE,
 ) -> None:
     """
     Adds retries to a requests HTTP/HTTPS session.
     The default values provide exponential backoff for a max wait of ~8.5 mins
 
     Reference the urllib3 documentation for more details about the kwargs.
+    The session is left untouched if it already has the same retries mounted.
 
     Args:
         session (Session): A requests session
         total (int): See urllib3 docs
         backoff_factor (int): See urllib3 docs
         status_forcelist (tuple[int]|None): See urllib3 docs
+        pool_size (int): Maximum number of connections kept in a pool per host
     """
     if status_forcelist is None:
-        status_forcelist = (408, 500, 502, 503, 504)
-    retries = Retry(
-        total=total,
-        backoff_factor=backoff_factor,
-        status_forcelist=status_forcelist,
-        # Don't raise a MaxRetryError for codes in status_forcelist.
-        # This allows for more graceful exception handling using
-        # Response.raise_for_status.
-        raise_on_status=False,
+        status_forcelist = DEFAULT_STATUS_FORCELIST
+    if (total, backoff_factor, tuple(status_forcelist)) == (
+        _DEFAULT_RETRY.total,
+        _DEFAULT_RETRY.backoff_factor,
+        DEFAULT_STATUS_FORCELIST,
+    ):
+        retries = _DEFAULT_RETRY
+    else:
+        retries = Retry(
+            total=total,
+            backoff_factor=backoff_factor,
+            status_forcelist=status_forcelist,
+            raise_on_status=False,
+        )
+
+    # The session already has the same retries and pool size
+    current = session.adapters.get("https://")
+    if (
+        getattr(current, "max_retries", None) is retries
+        and getattr(current, "_pool_maxsize", None) == pool_size
+        and session.adapters.get("http://") is current
+    ):
+        return
+
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries
     )
-    adapter = HTTPAdapter(max_retries=retries)
     session.mount("http://", adapter)
     session.mount("https://", adapter)
 
 
+def make_shared_session(pool_size: int = DEFAULT_POOL_SIZE) -> Session:
+    """
+    Create a requests HTTP/HTTPS session with retries meant to be shared
+    by multiple ContainerRegistry objects. Connections to the registries
+    (and their TLS handshakes) are then reused across the objects.
+
+    Args:
+        pool_size (int): Maximum number of connections kept in a pool per host
+
+    Returns:
+        Session: A requests session
+    """
+    session = Session()
+    add_session_retries(session, pool_size=pool_size)
+    return session
+
+
+def json_loads(data: Union[str, bytes]) -> Any:
+    """
+    Deserialize JSON document. The faster orjson parser is used if available.
+
+    Args:
+        data (Union[str, bytes]): JSON document
+
+    Returns:
+        Any: Deserialized JSON document
+
+    Raises:
+        ValueError: If the document is not a valid JSON
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def response_json(resp: Any) -> Any:
+    """
+    Deserialize JSON body of a HTTP response. The faster orjson parser is used
+    if available, otherwise the response's own decoder is used.
+
+    Args:
+        resp (Any): HTTP response
+
+    Returns:
+        Any: Deserialized JSON body
+    """
+    if orjson is not None:
+        return orjson.loads(resp.content)
+    return resp.json()
+
+
 def add_scheme_if_missing(url: str) -> str:
     """
     Add https:// to the url if it does not contain a scheme.
@@ -89,6 +187,6 @@ def add_scheme_if_missing(url: str) -> str:
     Returns:
         str: Url containing a scheme
     """
-    if not re.search(r"^[A-Za-z0-9+.\-]+://", url):
+    if not SCHEME_PATTERN.match(url):
         return f"https://{url}"
     return url
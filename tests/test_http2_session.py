@@ -0,0 +1,89 @@
+from typing import Any, List
+
+import httpx
+import pytest
+import requests
+
+from coregio.http2_session import HTTP2Session
+from coregio.registry_auth_httpx import HTTPXBasicAuthWithB64
+
+
+def test_init_new_client() -> None:
+    session = HTTP2Session()
+    assert isinstance(session.client, httpx.Client)
+    assert session.auth is None
+    session.close()
+
+    session = HTTP2Session(proxy="http://proxy:3128")
+    transport = session.client._transport_for_url(httpx.URL("https://quay.io"))
+    assert transport is not session.client._transport
+    session.close()
+
+
+def test__get_client() -> None:
+    session = HTTP2Session(proxy="http://proxy:3128")
+
+    assert session._get_client(True) is session.client
+    insecure_client = session._get_client(False)
+    assert insecure_client is not session.client
+    assert session._get_client(False) is insecure_client
+    transport = insecure_client._transport_for_url(httpx.URL("https://quay.io"))
+    assert transport is not insecure_client._transport
+
+    session.close()
+    assert insecure_client.is_closed
+
+
+@pytest.mark.parametrize(
+    ["timeout", "expected"],
+    [
+        (None, httpx.USE_CLIENT_DEFAULT),
+        ((7.0, 15.0), httpx.Timeout(15.0, connect=7.0)),
+        (5.0, httpx.Timeout(5.0)),
+    ],
+)
+def test__get_timeout(timeout: Any, expected: Any) -> None:
+    assert HTTP2Session._get_timeout(timeout) == expected
+
+
+def test_request() -> None:
+    requests_made: List[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests_made.append(request)
+        if request.method == "HEAD":
+            return httpx.Response(404)
+        return httpx.Response(
+            200,
+            json={"tags": ["latest"]},
+            headers={"Link": '</v2/repo/tags/list?n=1&last=latest>; rel="next"'},
+        )
+
+    session = HTTP2Session(client=httpx.Client(transport=httpx.MockTransport(handler)))
+
+    resp = session.request(
+        "GET",
+        "https://registry/v2/repo/tags/list",
+        params={"n": 1},
+        headers={"Accept": "application/json"},
+        timeout=(7.0, 15.0),
+        auth=HTTPXBasicAuthWithB64("Zm9vOmJhcg=="),
+        stream=True,
+    )
+
+    assert isinstance(resp, requests.Response)
+    assert resp.status_code == 200
+    assert resp.url == "https://registry/v2/repo/tags/list?n=1"
+    assert resp.json() == {"tags": ["latest"]}
+    assert b"".join(resp.iter_content(chunk_size=4)) == resp.content
+    assert resp.links["next"]["url"] == "/v2/repo/tags/list?n=1&last=latest"
+    assert requests_made[0].headers["Accept"] == "application/json"
+    assert requests_made[0].headers["Authorization"] == "Basic Zm9vOmJhcg=="
+    resp.close()
+
+    resp = session.request("HEAD", "https://registry/v2/repo/manifests/missing")
+
+    assert resp.status_code == 404
+    with pytest.raises(requests.HTTPError):
+        resp.raise_for_status()
+    assert "Authorization" not in requests_made[1].headers
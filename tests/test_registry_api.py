@@ -1,10 +1,37 @@
-from typing import Any, Dict, Set
+import io
+import json
+import threading
+from typing import Any, Dict, List, Set
 from unittest.mock import MagicMock, patch
 
+import httpx
+import ijson  # type: ignore[import-untyped]
 import pytest
 import requests
 
+from coregio import registry_api as registry_api_module
+from coregio.http2_session import HTTP2Session
 from coregio.registry_api import ContainerRegistry
+from coregio.registry_auth import (
+    DiskTokenCache,
+    HTTPBasicAuthWithB64,
+    HTTPBearerAuth,
+    HTTPOAuth2,
+)
+from coregio.registry_auth_httpx import (
+    HTTPXBasicAuthWithB64,
+    HTTPXBearerAuth,
+    HTTPXOAuth2,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_auth_method_cache() -> Any:
+    registry_api_module._AUTH_METHOD_CACHE.clear()
+    registry_api_module._parse_docker_cfg.cache_clear()
+    yield
+    registry_api_module._AUTH_METHOD_CACHE.clear()
+    registry_api_module._parse_docker_cfg.cache_clear()
 
 
 def test_init_new_session():
@@ -12,6 +39,7 @@ def test_init_new_session():
     adapter = registry_api.session.adapters["https://"]
 
     assert adapter.max_retries.total == 10
+    assert adapter._pool_maxsize == 32
 
 
 def test_init_pass_session():
@@ -22,6 +50,37 @@ def test_init_pass_session():
     assert adapter.max_retries.total == 0
 
 
+def test_init_http2_session() -> None:
+    registry_api = ContainerRegistry(url="fake_url", http2=True)
+
+    assert isinstance(registry_api.session, HTTP2Session)
+    assert isinstance(registry_api._get_auth(HTTPBearerAuth), HTTPXBearerAuth)
+    assert isinstance(registry_api._get_auth(HTTPOAuth2), HTTPXOAuth2)
+    assert isinstance(
+        registry_api._get_auth(HTTPBasicAuthWithB64), HTTPXBasicAuthWithB64
+    )
+    registry_api.session.close()
+
+    with pytest.raises(ValueError):
+        ContainerRegistry(url="fake_url", http2=True, disk_token_cache=MagicMock())
+
+
+def test_get_manifest_http2() -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.headers.get("Authorization") != "Basic Zm9vOmJhcg==":
+            return httpx.Response(401)
+        return httpx.Response(200, json={"schemaVersion": 2})
+
+    session = HTTP2Session(client=httpx.Client(transport=httpx.MockTransport(handler)))
+    cfg = json.dumps({"auths": {"registry": {"auth": "Zm9vOmJhcg=="}}})
+    registry_api = ContainerRegistry("registry", docker_cfg=cfg, session=session)
+
+    assert registry_api.get_manifest("repo", "latest") == {"schemaVersion": 2}
+    assert registry_api_module._AUTH_METHOD_CACHE["https://registry"] is (
+        HTTPBasicAuthWithB64
+    )
+
+
 @pytest.mark.parametrize(
     ["url", "expected_url"],
     [
@@ -49,6 +108,21 @@ def test__normalize_registry_url(
     assert result_url == expected_url
 
 
+@pytest.mark.parametrize(
+    ["url", "path", "expected_url"],
+    [
+        ("quay.io", "v2/repo/tags/list", "https://quay.io/v2/repo/tags/list"),
+        ("quay.io/ns", "/v2/repo/tags/list", "https://quay.io/v2/repo/tags/list"),
+        ("http://quay.io:8080", "v2/", "http://quay.io:8080/v2/"),
+        ("quay.io", "https://cdn.quay.io/blob", "https://cdn.quay.io/blob"),
+    ],
+)
+def test__get_full_url(url: str, path: str, expected_url: str) -> None:
+    registry_api = ContainerRegistry(url=url)
+
+    assert registry_api._get_full_url(path) == expected_url
+
+
 @pytest.mark.parametrize(
     ["registry", "cfg", "auth", "token"],
     [
@@ -77,6 +151,41 @@ def test__get__get_auth_token(
     assert resp_token == token
 
 
+@patch("coregio.utils.json_loads")
+def test__get_auth_token_cache(mock_loads: MagicMock) -> None:
+    mock_loads.return_value = {"auths": {"quay.io": {"auth": "Zm9vOmJhcg=="}}}
+    registry_api = ContainerRegistry(url="quay.io", docker_cfg="cfg")
+
+    assert registry_api._get_auth_token() == "Zm9vOmJhcg=="
+    assert registry_api._get_auth_token() == "Zm9vOmJhcg=="
+    mock_loads.assert_called_once_with("cfg")
+
+    registry_api.docker_cfg = None
+    assert registry_api._get_auth_token() is None
+
+
+@patch("coregio.utils.json_loads")
+def test__get_auth_token_shared_config(mock_loads: MagicMock) -> None:
+    mock_loads.return_value = {
+        "auths": {"quay.io": {"auth": "Zm9vOmJhcg=="}, "docker.io": {"auth": "YQ=="}}
+    }
+
+    quay = ContainerRegistry(url="quay.io", docker_cfg="cfg")
+    docker = ContainerRegistry(url="docker.io", docker_cfg="cfg")
+
+    assert quay._get_auth_token() == "Zm9vOmJhcg=="
+    assert docker._get_auth_token() == "YQ=="
+    mock_loads.assert_called_once_with("cfg")
+
+
+def test__get_auth_token_dict_config() -> None:
+    registry_api = ContainerRegistry(
+        url="quay.io", docker_cfg={"auths": {"quay.io": {"auth": "Zm9vOmJhcg=="}}}
+    )
+
+    assert registry_api._get_auth_token() == "Zm9vOmJhcg=="
+
+
 @pytest.mark.parametrize(
     ["registry", "docker_config", "expected_token"],
     [
@@ -94,6 +203,9 @@ def test__get__get_auth_token(
         ("docker.io", {"https://docker.io": "123"}, "123"),
         ("docker.io", {"https://index.docker.io": "123"}, "123"),
         ("registry-1.docker.io", {"https://index.docker.io": "123"}, "123"),
+        ("quay.io", {"https://api.registry.quay.io": "1", "quay.io": "2"}, "1"),
+        ("quay.io", {"quay.io": "1", "https://api.registry.quay.io": "2"}, "1"),
+        ("https://quay.io", {"quay.io": "1", "https://quay.io": "2"}, "2"),
     ],
 )
 def test__select_registry_auth_token_from_docker_config(
@@ -120,6 +232,22 @@ def test__get_session(mock_auth_token: MagicMock) -> None:
 
     assert session.auth == mock_auth
 
+    registry._get_session(auth_method)
+    mock_auth_token.assert_called_once()
+
+
+@patch("coregio.registry_api.ContainerRegistry._get_auth_token")
+def test__get_auth_disk_token_cache(mock_auth_token: MagicMock) -> None:
+    disk_token_cache = DiskTokenCache("tokens.json")
+    registry = ContainerRegistry("quay.io", disk_token_cache=disk_token_cache)
+
+    assert registry._get_auth(HTTPBearerAuth).disk_cache is disk_token_cache
+    assert registry._get_auth(HTTPOAuth2).disk_cache is disk_token_cache
+    assert isinstance(registry._get_auth(HTTPBasicAuthWithB64), HTTPBasicAuthWithB64)
+
+    registry = ContainerRegistry("quay.io")
+    assert registry._get_auth(HTTPBearerAuth).disk_cache is None
+
 
 @pytest.mark.parametrize(
     ["status_codes"],
@@ -129,23 +257,69 @@ def test__get_session(mock_auth_token: MagicMock) -> None:
         ((401, 401, 401),),
     ],
 )
-@patch("coregio.registry_api.ContainerRegistry._get_session")
-def test__get(mock_session: MagicMock, status_codes: Set[int]) -> None:
-    sessions = []
+@patch("coregio.registry_api.ContainerRegistry._get_auth")
+def test__get(mock_auth: MagicMock, status_codes: Set[int]) -> None:
+    responses = []
     for code in status_codes:
         expected_response = requests.Response()
         expected_response.status_code = code
-
-        session = MagicMock()
-        session.get.return_value = expected_response
-        session.auth.auth_header = "Bearer foo"
-        sessions.append(session)
-    mock_session.side_effect = sessions
+        responses.append(expected_response)
+    mock_auth.return_value.auth_header = "Bearer foo"
 
     registry = ContainerRegistry("test-quay.io", "foo")
+    registry.session = MagicMock()
+    registry.session.request.side_effect = responses
     resp = registry._get("foo", {}, {}, True)
-    assert resp.status_code == sessions[-1].get.return_value.status_code
+    assert resp.status_code == responses[-1].status_code
     assert registry.auth_header == "Bearer foo"
+    assert registry.session.request.call_count == len(status_codes)
+
+
+@patch("coregio.registry_api.ContainerRegistry._get_auth")
+def test__get_stream(mock_auth: MagicMock) -> None:
+    unauthorized = MagicMock(status_code=401)
+    success = MagicMock(status_code=200)
+
+    registry = ContainerRegistry("test-quay.io", "foo")
+    registry.session = MagicMock()
+    registry.session.request.side_effect = [unauthorized, success]
+    resp = registry._get("foo", stream=True)
+
+    assert resp == success
+    assert registry.session.request.call_args.kwargs["stream"] is True
+    unauthorized.close.assert_called_once()
+    success.close.assert_not_called()
+
+
+@patch("coregio.registry_api.ContainerRegistry._get_auth")
+def test__get_auth_method_cache(mock_auth: MagicMock) -> None:
+    unauthorized = requests.Response()
+    unauthorized.status_code = 401
+    success = requests.Response()
+    success.status_code = 200
+
+    registry = ContainerRegistry("test-quay.io", "foo")
+    registry.session = MagicMock()
+    registry.session.request.side_effect = [
+        unauthorized,
+        unauthorized,
+        success,
+        success,
+    ]
+    registry._get("foo")
+    registry._get("foo")
+
+    assert [call.args[0] for call in mock_auth.call_args_list] == [
+        HTTPBearerAuth,
+        HTTPOAuth2,
+        HTTPBasicAuthWithB64,
+        HTTPBasicAuthWithB64,
+    ]
+    assert registry._get_auth_methods() == [
+        HTTPBasicAuthWithB64,
+        HTTPBearerAuth,
+        HTTPOAuth2,
+    ]
 
 
 @patch("coregio.utils.handle_response")
@@ -158,28 +332,350 @@ def test_get_request(
     mock_handle.return_value = None
     resp = ContainerRegistry("foo", "bar").get_request("/v1/api")
     assert resp == mock_get.return_value
-    mock_get.assert_called_once_with("https://foo/v1/api", params=None, headers=None)
+    mock_get.assert_called_once_with(
+        "https://foo/v1/api", params=None, headers=None, stream=False
+    )
+
+
+def _page_response(data: Any, next_page: Any = None) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = 200
+    resp._content = json.dumps({"foo": data}).encode()
+    resp._content_consumed = True  # type: ignore[attr-defined]
+    if next_page:
+        resp.headers["Link"] = f'<{next_page}>; rel="next"'
+    return resp
+
+
+@patch("coregio.utils.handle_response")
+@patch("coregio.registry_api.ContainerRegistry._request")
+def test_head_request(mock_request: MagicMock, mock_handle: MagicMock) -> None:
+    resp = ContainerRegistry("foo", "bar").head_request("/v2/repo/manifests/tag")
+
+    assert resp == mock_request.return_value
+    mock_request.assert_called_once_with(
+        "HEAD", "https://foo/v2/repo/manifests/tag", params=None, headers=None
+    )
+    mock_handle.assert_called_once_with(resp)
+    mock_request.return_value.raise_for_status.assert_called_once()
 
 
 @patch("coregio.registry_api.ContainerRegistry.get_request")
 def test_paginated_response(mock_get: MagicMock) -> None:
-    get = MagicMock()
-    get.json.return_value = {"foo": ["bar1", "bar2"]}
-    get.links = {"next": {"url": "test.url"}}
-    mock_get.return_value = get
+    mock_get.return_value = _page_response(["bar1", "bar2"], "test.url")
 
     registry = ContainerRegistry("foo", "bar")
     result = registry.get_paginated_response("v2/foo", "foo", page_size=1, limit=1)
     assert result == ["bar1"]
-    mock_get.assert_called_once_with("v2/foo", headers=None, params={"n": 1})
+    mock_get.assert_called_once_with(
+        "v2/foo", headers=None, params={"n": 1}, stream=True
+    )
 
-    get.links = {}
-    mock_get.return_value = get
+    mock_get.return_value = _page_response(["bar1", "bar2"])
     mock_get.reset_mock()
     result = registry.get_paginated_response("v2/foo", "foo")
     assert result == ["bar1", "bar2"]
 
 
+@patch("coregio.registry_api.ijson", None)
+@patch("coregio.registry_api.ContainerRegistry.get_request")
+def test_paginated_response_without_ijson(mock_get: MagicMock) -> None:
+    mock_get.side_effect = [
+        _page_response(["bar1", "bar2"], "/v2/foo?n=2&last=bar2"),
+        _page_response(["bar3", "bar4"], "/v2/foo?n=2&last=bar4"),
+    ]
+
+    registry = ContainerRegistry("foo", "bar")
+    result = registry.get_paginated_response("v2/foo", "foo", page_size=2, limit=3)
+    assert result == ["bar1", "bar2", "bar3"]
+    assert mock_get.call_args.kwargs["stream"] is False
+
+
+def test__get_page_data() -> None:
+    resp = _page_response(["bar1", "bar2", "bar3"])
+    # The content is streamed from the raw response
+    resp.raw = io.BytesIO(resp.content)
+    resp._content = False  # type: ignore[assignment]
+    resp._content_consumed = False  # type: ignore[attr-defined]
+
+    page_data = ContainerRegistry._get_page_data(resp, "foo", 2)
+
+    assert page_data == ["bar1", "bar2"]
+    assert ContainerRegistry._get_page_data(_page_response([]), "foo") == []
+    assert ContainerRegistry._get_page_data(_page_response(["a"]), "bar") == []
+
+
+def test__get_page_data_invalid() -> None:
+    resp = _page_response(["bar1"])
+    resp._content = b'{"foo": ["bar1", '
+
+    with patch.object(resp, "close") as mock_close:
+        with pytest.raises(ijson.JSONError):
+            ContainerRegistry._get_page_data(resp, "foo")
+
+    mock_close.assert_called_once()
+
+
+@pytest.mark.parametrize(
+    ["next_page", "page_query", "expected_pages"],
+    [
+        ("/v2/foo?n=2&last=bar", {}, []),
+        ("/v2/foo?n=2&page=", {}, []),
+        (
+            "/v2/foo?n=2&page=2",
+            {},
+            ["/v2/foo?n=2&page=2", "/v2/foo?n=2&page=3", "/v2/foo?n=2&page=4"],
+        ),
+        (
+            "https://foo/v2/foo?offset=2&n=2",
+            {"n": ["2"]},
+            [
+                "https://foo/v2/foo?offset=2&n=2",
+                "https://foo/v2/foo?offset=4&n=2",
+                "https://foo/v2/foo?offset=6&n=2",
+            ],
+        ),
+        # The registry returns less records than requested
+        (
+            "/v2/foo?offset=10&n=4",
+            {"offset": ["5"], "n": ["4"]},
+            ["/v2/foo?offset=10&n=4", "/v2/foo?offset=15&n=4", "/v2/foo?offset=20&n=4"],
+        ),
+        ("/v2/foo?offset=2&n=2", {"offset": ["2"]}, []),
+        ("/v2/foo?offset=2&n=2", {"offset": ["x"]}, []),
+    ],
+)
+def test__get_following_pages(
+    next_page: str, page_query: Dict[str, List[str]], expected_pages: Any
+) -> None:
+    pages = ContainerRegistry._get_following_pages(next_page, 3, page_query)
+
+    assert pages == expected_pages
+
+
+@patch("coregio.registry_api.ContainerRegistry.get_request")
+def test_paginated_response_concurrent(mock_get: MagicMock) -> None:
+    responses = {
+        "v2/foo": _page_response(["a", "b"], "/v2/foo?n=2&page=2"),
+        "/v2/foo?n=2&page=2": _page_response(["c", "d"], "/v2/foo?n=2&page=3"),
+        "/v2/foo?n=2&page=3": _page_response(["e", "f"], "/v2/foo?n=2&page=4"),
+        "/v2/foo?n=2&page=4": _page_response(["g"]),
+    }
+
+    def get_request(page: str, **_: Any) -> Any:
+        if page not in responses:
+            raise requests.HTTPError("Page not found")
+        return responses[page]
+
+    mock_get.side_effect = get_request
+
+    registry = ContainerRegistry("foo", "bar")
+    result = registry.get_paginated_response(
+        "v2/foo", "foo", page_size=2, concurrency=2
+    )
+    assert result == ["a", "b", "c", "d", "e", "f", "g"]
+
+    result = registry.get_paginated_response(
+        "v2/foo", "foo", page_size=2, limit=3, concurrency=2
+    )
+    assert result == ["a", "b", "c"]
+
+
+def test__get_page_query() -> None:
+    assert ContainerRegistry._get_page_query("/v2/foo?offset=2&n=2", None) == {
+        "offset": ["2"],
+        "n": ["2"],
+    }
+    assert ContainerRegistry._get_page_query("v2/foo", {"n": 5, "offset": 0}) == {
+        "n": ["5"],
+        "offset": ["0"],
+    }
+
+
+def test__is_same_page() -> None:
+    assert ContainerRegistry._is_same_page("/v2/foo?a=1&b=2", "/v2/foo?b=2&a=1")
+    assert not ContainerRegistry._is_same_page("/v2/foo?a=1", "/v2/foo?a=2")
+    assert not ContainerRegistry._is_same_page("/v2/foo?a=1", "/v2/bar?a=1")
+
+
+@pytest.mark.parametrize(["concurrency"], [(1,), (4,)])
+@patch("coregio.registry_api.ContainerRegistry.get_request")
+def test_paginated_response_capped_page_size(
+    mock_get: MagicMock, concurrency: int
+) -> None:
+    tags = [f"tag{index}" for index in range(300)]
+
+    def get_request(page: str, params: Any = None, **_: Any) -> Any:
+        # The registry returns at most 50 records per page
+        query = ContainerRegistry._get_page_query(page, params)
+        offset = int(query.get("offset", ["0"])[0])
+        size = min(int(query["n"][0]), 50)
+        next_page = None
+        if offset + size < len(tags):
+            next_page = f"/v2/foo?n={query['n'][0]}&offset={offset + size}"
+        return _page_response(tags[offset : offset + size], next_page)
+
+    mock_get.side_effect = get_request
+
+    registry = ContainerRegistry("foo", "bar")
+    result = registry.get_paginated_response(
+        "v2/foo", "foo", page_size=100, concurrency=concurrency
+    )
+
+    assert result == tags
+
+
+@patch("coregio.registry_api.ContainerRegistry.get_request")
+def test_paginated_response_unpredictable(mock_get: MagicMock) -> None:
+    # Page sizes vary, so the predicted pages don't match the real links
+    responses = {
+        "v2/foo": _page_response(["a", "b"], "/v2/foo?n=2&offset=2"),
+        "/v2/foo?n=2&offset=2": _page_response(["c"], "/v2/foo?n=2&offset=3"),
+        "/v2/foo?n=2&offset=3": _page_response(["d", "e"], "/v2/foo?n=2&offset=5"),
+        "/v2/foo?n=2&offset=5": _page_response(["f"]),
+    }
+    mock_get.side_effect = lambda page, **_: responses.get(page, _page_response(["x"]))
+
+    registry = ContainerRegistry("foo", "bar")
+    result = registry.get_paginated_response(
+        "v2/foo", "foo", page_size=2, concurrency=3
+    )
+
+    assert result == ["a", "b", "c", "d", "e", "f"]
+    # Pages are fetched one by one after the wrong prediction
+    assert [call.args[0] for call in mock_get.call_args_list][-2:] == [
+        "/v2/foo?n=2&offset=3",
+        "/v2/foo?n=2&offset=5",
+    ]
+
+
+@patch("coregio.registry_api.ContainerRegistry.get_request")
+def test_paginated_response_concurrent_discarded(mock_get: MagicMock) -> None:
+    responses = {
+        "v2/foo": _page_response(["a", "b"], "/v2/foo?n=2&page=2"),
+        "/v2/foo?n=2&page=2": _page_response(["c", "d"], "/v2/foo?n=2&page=3"),
+        "/v2/foo?n=2&page=3": _page_response(["e", "f"], "/v2/foo?n=2&page=4"),
+    }
+    last_page_requested = threading.Event()
+
+    def get_request(page: str, **_: Any) -> Any:
+        if page == "/v2/foo?n=2&page=2":
+            # Make sure the last page is being fetched and can't be cancelled
+            last_page_requested.wait(5)
+        if page == "/v2/foo?n=2&page=3":
+            last_page_requested.set()
+        if page not in responses:
+            raise requests.HTTPError("Page not found")
+        return responses[page]
+
+    mock_get.side_effect = get_request
+
+    registry = ContainerRegistry("foo", "bar")
+    with patch.object(responses["/v2/foo?n=2&page=3"], "close") as mock_close:
+        result = registry.get_paginated_response(
+            "v2/foo", "foo", page_size=2, limit=3, concurrency=3
+        )
+
+    assert result == ["a", "b", "c"]
+    # The page fetched beyond the limit is closed as well
+    mock_close.assert_called_once()
+
+
+@patch("coregio.registry_api.ContainerRegistry.get_request")
+def test_paginated_response_error(mock_get: MagicMock) -> None:
+    first_page = _page_response(["a", "b"], "/v2/foo?n=2&page=2")
+    last_page = _page_response(["e"])
+    last_page_requested = threading.Event()
+
+    def get_request(page: str, **_: Any) -> Any:
+        if page == "v2/foo":
+            return first_page
+        if page == "/v2/foo?n=2&page=2":
+            # Make sure the last page is being fetched and can't be cancelled
+            last_page_requested.wait(5)
+            raise requests.HTTPError("Server error")
+        last_page_requested.set()
+        return last_page
+
+    mock_get.side_effect = get_request
+
+    registry = ContainerRegistry("foo", "bar")
+    with patch.object(last_page, "close") as mock_close:
+        with pytest.raises(requests.HTTPError):
+            registry.get_paginated_response("v2/foo", "foo", page_size=2, concurrency=2)
+
+    mock_close.assert_called_once()
+
+
+@patch("coregio.registry_api.ThreadPoolExecutor")
+@patch("coregio.registry_api.ContainerRegistry.get_request")
+def test_paginated_response_cursor(
+    mock_get: MagicMock, mock_executor: MagicMock
+) -> None:
+    mock_get.side_effect = [
+        _page_response(["a", "b"], "https://foo/v2/foo?n=2&last=b"),
+        _page_response(["c", "d"], "/v2/foo?n=2&last=d"),
+        _page_response([], "/v2/foo?n=2&last=e"),
+    ]
+    params = {"foo": "bar"}
+
+    registry = ContainerRegistry("foo", "bar")
+    result = registry.get_paginated_response(
+        "v2/foo", "foo", params=params, page_size=2
+    )
+
+    assert result == ["a", "b", "c", "d"]
+    assert params == {"foo": "bar"}
+    assert [
+        (call.args[0], call.kwargs["params"]) for call in mock_get.call_args_list
+    ] == [
+        ("v2/foo", {"foo": "bar", "n": 2}),
+        ("/v2/foo?n=2&last=b", None),
+        ("/v2/foo?n=2&last=d", None),
+    ]
+    mock_executor.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    ["next_page", "expected"],
+    [
+        (None, None),
+        ("https://foo/v2/foo/tags/list", "/v2/foo/tags/list"),
+        ("https://foo/v2/foo/tags/list?n=2&last=b", "/v2/foo/tags/list?n=2&last=b"),
+        ("/v2/foo/tags/list?n=2&last=b", "/v2/foo/tags/list?n=2&last=b"),
+    ],
+)
+def test__get_page_path(next_page: Any, expected: Any) -> None:
+    assert ContainerRegistry._get_page_path(next_page) == expected
+
+
+@pytest.mark.parametrize(
+    ["manifest_types", "expected"],
+    [
+        pytest.param(
+            None,
+            "application/vnd.docker.distribution.manifest.v2+json, "
+            "application/vnd.oci.image.manifest.v1+json",
+            id="default",
+        ),
+        pytest.param(
+            ["oci_index", "docker_manifest_list"],
+            "application/vnd.oci.image.index.v1+json, "
+            "application/vnd.docker.distribution.manifest.list.v2+json",
+            id="custom",
+        ),
+        pytest.param(
+            ["docker_manifest_list", "oci_index"],
+            "application/vnd.docker.distribution.manifest.list.v2+json, "
+            "application/vnd.oci.image.index.v1+json",
+            id="custom order",
+        ),
+    ],
+)
+def test_get_accept_header(manifest_types: Any, expected: str) -> None:
+    assert registry_api_module.get_accept_header(manifest_types) == expected
+
+
 @patch("coregio.utils.handle_response")
 @patch("coregio.registry_api.ContainerRegistry.get_request")
 def test_get_manifest_raw(
@@ -207,16 +703,137 @@ def test_get_manifest_raw(
         registry.get_manifest("repo", "ref")
 
 
+def _manifest_response(digest: str) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = 200
+    resp._content = b'{"schemaVersion": 2}'
+    resp.headers["Docker-Content-Digest"] = digest
+    return resp
+
+
+@patch("coregio.registry_api.ContainerRegistry.get_request")
+def test_get_manifest_raw_cache(mock_get: MagicMock) -> None:
+    mock_get.side_effect = [
+        _manifest_response("sha256:1"),
+        _manifest_response("sha256:2"),
+        _manifest_response("sha256:3"),
+    ]
+    registry = ContainerRegistry("registry", "docker_cfg")
+
+    resp = registry.get_manifest_raw("repo", "tag")
+    assert registry.get_manifest_raw("repo", "tag") is resp
+    assert registry.get_manifest_raw("repo", "sha256:1") is resp
+    assert mock_get.call_count == 1
+
+    # Different accept header is cached separately
+    registry.get_manifest_raw("repo", "other", ["oci_index"])
+    registry.get_manifest_raw("repo", "other", ["oci_index"])
+    assert mock_get.call_count == 2
+
+    registry.invalidate_manifest("repo", "tag")
+    assert [key[1] for key in registry._manifest_cache] == ["sha256:2", "other"]
+
+    new_resp = registry.get_manifest_raw("repo", "sha256:1")
+    assert new_resp is not resp
+    assert mock_get.call_count == 3
+
+
+@patch("coregio.registry_api.time.monotonic")
+@patch("coregio.registry_api.ContainerRegistry.get_request")
+def test_get_manifest_raw_cache_expiration(
+    mock_get: MagicMock, mock_monotonic: MagicMock
+) -> None:
+    mock_get.side_effect = lambda *_, **__: _manifest_response("sha256:1")
+    mock_monotonic.return_value = 0
+    registry = ContainerRegistry("registry", "docker_cfg")
+    registry.MANIFEST_CACHE_SIZE = 1
+
+    resp = registry.get_manifest_raw("repo", "sha256:1")
+    mock_monotonic.return_value = registry.MANIFEST_CACHE_TTL
+    assert registry.get_manifest_raw("repo", "sha256:1") is resp
+
+    mock_monotonic.return_value = registry.MANIFEST_CACHE_TTL + 1
+    assert registry.get_manifest_raw("repo", "sha256:1") is not resp
+    assert mock_get.call_count == 2
+
+    # The cache size is limited
+    registry.get_manifest_raw("repo", "tag")
+    assert [key[1] for key in registry._manifest_cache] == ["sha256:1"]
+    assert registry.get_manifest_raw("repo", "sha256:1") is not resp
+
+
+@patch("coregio.registry_api.ContainerRegistry.get_manifest_raw")
+def test_get_manifests_batch(
+    mock_get_manifest_raw: MagicMock,
+) -> None:
+    error_response = requests.Response()
+    error_response.status_code = 404
+
+    def get_manifest_raw(repository: str, reference: str, manifest_types: Any) -> Any:
+        if reference == "missing":
+            raise requests.HTTPError(response=error_response)
+        return f"{repository}:{reference}"
+
+    mock_get_manifest_raw.side_effect = get_manifest_raw
+    registry_api = ContainerRegistry(url="registry")
+    result = registry_api.get_manifests_batch("repo", ["ref1", "missing", "ref2"])
+
+    assert result == {
+        "ref1": "repo:ref1",
+        "missing": error_response,
+        "ref2": "repo:ref2",
+    }
+    assert mock_get_manifest_raw.call_count == 3
+
+
+@patch("coregio.registry_api.ContainerRegistry.head_request")
+def test_get_digests(mock_head: MagicMock) -> None:
+    def head_request(uri: str, headers: Any) -> Any:
+        resp = requests.Response()
+        if uri.endswith("/missing"):
+            resp.status_code = 404
+            raise requests.HTTPError("Not found", response=resp)
+        if uri.endswith("/denied"):
+            resp.status_code = 401
+            raise requests.HTTPError("Unauthorized", response=resp)
+        resp.headers["Docker-Content-Digest"] = "sha256:" + uri.rsplit("/", 1)[-1]
+        return resp
+
+    mock_head.side_effect = head_request
+    registry_api = ContainerRegistry(url="registry")
+
+    result = registry_api.get_digests("repo", ["tag1", "missing", "tag2"])
+
+    assert result == {"tag1": "sha256:tag1", "missing": None, "tag2": "sha256:tag2"}
+    mock_head.assert_any_call(
+        "v2/repo/manifests/tag1",
+        headers={
+            "Accept": "application/vnd.docker.distribution.manifest.v2+json, "
+            "application/vnd.oci.image.manifest.v1+json"
+        },
+    )
+
+    registry_api.get_digests("repo", ["tag1"], manifest_types=["oci_index"])
+    mock_head.assert_called_with(
+        "v2/repo/manifests/tag1",
+        headers={"Accept": "application/vnd.oci.image.index.v1+json"},
+    )
+
+    with pytest.raises(requests.HTTPError):
+        registry_api.get_digests("repo", ["tag1", "denied"])
+
+
 @patch("coregio.registry_api.ContainerRegistry.get_manifest_raw")
 def test_get_manifest(
     mock_get_manifest_raw: MagicMock,
 ) -> None:
     manifest_rsp = MagicMock()
+    manifest_rsp.content = b'{"schemaVersion": 2}'
     mock_get_manifest_raw.return_value = manifest_rsp
     registry_api = ContainerRegistry(url="registry")
     result = registry_api.get_manifest("repo", "ref")
 
-    assert result == manifest_rsp.json()
+    assert result == {"schemaVersion": 2}
     mock_get_manifest_raw.assert_called_once_with("repo", "ref", None)
 
     mock_get_manifest_raw.reset_mock()
@@ -0,0 +1,130 @@
+import asyncio
+import json
+from typing import Any, Callable, Dict, List
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from coregio.registry_api_async import AsyncContainerRegistry
+from coregio.registry_auth_httpx import (
+    HTTPXBasicAuthWithB64,
+    HTTPXBearerAuth,
+    HTTPXOAuth2,
+)
+
+
+def _registry(
+    handler: Callable[[httpx.Request], httpx.Response], **kwargs: Any
+) -> AsyncContainerRegistry:
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return AsyncContainerRegistry("registry", client=client, **kwargs)
+
+
+def test_init_new_client() -> None:
+    registry = AsyncContainerRegistry("quay.io")
+    assert isinstance(registry.client, httpx.AsyncClient)
+    assert registry.url == "https://quay.io"
+    asyncio.run(registry.close())
+
+    registry = AsyncContainerRegistry("quay.io", proxy="http://proxy:3128")
+    transport = registry.client._transport_for_url(httpx.URL("https://quay.io"))
+    assert transport is not registry.client._transport
+    asyncio.run(registry.close())
+
+
+def test__get_auth() -> None:
+    cfg = json.dumps({"auths": {"registry": {"auth": "Zm9vOmJhcg=="}}})
+    registry = _registry(lambda _: httpx.Response(200), docker_cfg=cfg)
+
+    auth = registry._get_auth(HTTPXBearerAuth)
+
+    assert isinstance(auth, HTTPXBearerAuth)
+    assert auth.auth_b64 == "Zm9vOmJhcg=="
+    assert registry._get_auth(HTTPXBearerAuth) is auth
+
+
+@pytest.mark.parametrize(
+    ["status_codes", "expected_auth"],
+    [
+        ((200,), HTTPXBearerAuth),
+        ((401, 200), HTTPXOAuth2),
+        ((401, 401, 401), HTTPXBasicAuthWithB64),
+    ],
+)
+def test__get(status_codes: List[int], expected_auth: Any) -> None:
+    codes = iter(status_codes)
+    registry = _registry(lambda _: httpx.Response(next(codes)))
+
+    with patch.object(registry, "_get_auth", wraps=registry._get_auth) as mock_auth:
+        resp = asyncio.run(registry._get("https://registry/v2/"))
+
+    assert resp.status_code == status_codes[-1]
+    assert mock_auth.call_args.args[0] == expected_auth
+
+
+def test_get_request() -> None:
+    registry = _registry(lambda _: httpx.Response(404, text="not found"))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(registry.get_request("v2/repo/manifests/latest"))
+
+
+def test_get_tags() -> None:
+    pages: Dict[str, httpx.Response] = {
+        "/v2/repo/tags/list?n=2": httpx.Response(
+            200,
+            json={"tags": ["a", "b"]},
+            headers={"Link": '</v2/repo/tags/list?n=2&last=b>; rel="next"'},
+        ),
+        "/v2/repo/tags/list?n=2&last=b": httpx.Response(200, json={"tags": ["c"]}),
+    }
+    requests: List[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.raw_path.decode()
+        requests.append(path)
+        return pages[path]
+
+    registry = _registry(handler)
+
+    assert asyncio.run(registry.get_tags("repo", page_size=2)) == ["a", "b", "c"]
+    assert requests == list(pages)
+
+    requests.clear()
+    assert asyncio.run(registry.get_tags("repo", page_size=2, limit=1)) == ["a"]
+    assert len(requests) == 1
+
+
+def test_get_manifest() -> None:
+    requests: List[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        reference = request.url.path.rsplit("/", 1)[-1]
+        return httpx.Response(
+            200,
+            json={"reference": reference},
+            headers={"Docker-Content-Digest": f"sha256:{reference}"},
+        )
+
+    async def get_manifests() -> Any:
+        async with _registry(handler) as registry:
+            return (
+                await registry.get_manifest("repo", "latest"),
+                await registry.get_manifest(
+                    "repo", "latest", ["oci_index"], is_headers=True
+                ),
+                await registry.gather_manifests("repo", ["a", "b"]),
+            )
+
+    manifest, headers, manifests = asyncio.run(get_manifests())
+
+    assert manifest == {"reference": "latest"}
+    assert headers["Docker-Content-Digest"] == "sha256:latest"
+    assert manifests == {"a": {"reference": "a"}, "b": {"reference": "b"}}
+    assert requests[0].headers["Accept"] == (
+        "application/vnd.docker.distribution.manifest.v2+json, "
+        "application/vnd.oci.image.manifest.v1+json"
+    )
+    assert requests[1].headers["Accept"] == "application/vnd.oci.image.index.v1+json"
@@ -1,6 +1,15 @@
+import base64
+import json
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
 from unittest.mock import MagicMock, patch
 
 import pytest
+import requests
 
 from coregio import registry_auth
 
@@ -10,6 +19,13 @@ def bearer_auth():
     return registry_auth.HTTPBearerAuth("foo")
 
 
+@pytest.fixture(autouse=True)
+def clear_realm_cache() -> Any:
+    registry_auth._REALM_CACHE.clear()
+    yield
+    registry_auth._REALM_CACHE.clear()
+
+
 def test_HTTPBasicAuthWithB64() -> None:
     response = MagicMock()
     response.headers = {}
@@ -18,27 +34,32 @@ def test_HTTPBasicAuthWithB64() -> None:
     resp = auth(response)
 
     assert resp.headers["Authorization"] == "Basic foo"
+    assert auth.auth_header == "Basic foo"
 
 
 @patch("coregio.registry_auth.HTTPBearerAuth._set_header")
-@patch("coregio.registry_auth.HTTPBearerAuth._get_repo_from_url")
+@patch("coregio.registry_auth._extract_repo")
 def test_HTTPBearerAuth(
-    mock__get_repo_from_url: MagicMock,
+    mock__extract_repo: MagicMock,
     mock__set_header: MagicMock,
     bearer_auth: registry_auth.HTTPBearerAuth,
 ) -> None:
     response = MagicMock()
 
-    mock__get_repo_from_url.return_value = "repo123"
+    mock__extract_repo.return_value = "repo123"
 
     resp = bearer_auth(response)
 
     mock__set_header.assert_not_called()
 
+    response.register_hook.assert_called_once()
+
+    # The hook is registered with a cached token too, to refresh it once
+    # the registry rejects it
     bearer_auth.token_cache["repo123"] = "bar"
     bearer_auth(response)
-    mock__set_header.assert_called_once_with(response, "repo123")
-    response.register_hook.assert_called_once()
+    mock__set_header.assert_called_once_with(response, "bar")
+    assert response.register_hook.call_count == 2
 
 
 def test_HTTPBearerAuth_auth_token(
@@ -50,6 +71,16 @@ def test_HTTPBearerAuth_auth_token(
     assert bearer_auth.auth_header == "foo"
 
 
+def _bearer_401_response(request_headers: Any = None) -> MagicMock:
+    response = MagicMock()
+    response.status_code = 401
+    response.headers = {"www-authenticate": "bearer realm=foo"}
+    response.request.headers = request_headers or {}
+    response.request.copy.return_value.headers = {}
+    response.connection.send.side_effect = lambda request, **_: MagicMock()
+    return response
+
+
 @patch("coregio.registry_auth.extract_cookies_to_jar")
 @patch("coregio.registry_auth.HTTPBearerAuth._get_token")
 def test_HTTPBearerAuth_handle_401(
@@ -72,23 +103,155 @@ def test_HTTPBearerAuth_handle_401(
 
     assert resp == response
 
-    response = MagicMock()
-    response.status_code = 401
-    response.headers = {"www-authenticate": "bearer realm=foo"}
+    response = _bearer_401_response()
 
     mock_get_token.return_value = "bar"
     resp = bearer_auth.handle_401(response, "foo")
 
     assert bearer_auth.token_cache["foo"] == "bar"
+    assert resp.request.headers["Authorization"] == "Bearer bar"
+
+
+@pytest.mark.parametrize(
+    ["auth_info", "expected_auth_info"],
+    [
+        ("", None),
+        ("Basic realm=foo", None),
+        ("Bearer", None),
+        ('Bearer realm="https://auth/token"', 'realm="https://auth/token"'),
+        (' BEARER  realm="a",\nservice="b"', 'realm="a",\nservice="b"'),
+    ],
+)
+@patch("coregio.registry_auth.extract_cookies_to_jar")
+@patch("coregio.registry_auth.HTTPBearerAuth._get_token")
+def test_HTTPBearerAuth_handle_401_challenge(
+    mock_get_token: MagicMock,
+    mock_extract_cookies_to_jar: MagicMock,
+    auth_info: str,
+    expected_auth_info: Any,
+    bearer_auth: registry_auth.HTTPBearerAuth,
+) -> None:
+    response = _bearer_401_response()
+    response.headers = {"www-authenticate": auth_info}
+
+    resp = bearer_auth.handle_401(response, "foo")
+
+    if expected_auth_info is None:
+        assert resp is response
+        mock_get_token.assert_not_called()
+    else:
+        mock_get_token.assert_called_once_with(expected_auth_info, "foo")
+
+
+@patch("coregio.registry_auth.extract_cookies_to_jar")
+@patch("coregio.registry_auth.HTTPBearerAuth._get_token")
+def test_HTTPBearerAuth_handle_401_cached_token(
+    mock_get_token: MagicMock,
+    mock_extract_cookies_to_jar: MagicMock,
+    bearer_auth: registry_auth.HTTPBearerAuth,
+) -> None:
+    mock_get_token.return_value = "new"
+    bearer_auth.token_cache["foo"] = "bar"
+
+    # The token has been refreshed by another thread in the meantime
+    response = _bearer_401_response()
+    resp = bearer_auth.handle_401(response, "foo")
+
+    mock_get_token.assert_not_called()
+    assert resp.request.headers["Authorization"] == "Bearer bar"
+
+    # The cached token was rejected
+    response = _bearer_401_response({"Authorization": "Bearer bar"})
+    resp = bearer_auth.handle_401(response, "foo")
+
+    mock_get_token.assert_called_once_with("realm=foo", "foo")
+    assert bearer_auth.token_cache["foo"] == "new"
+    assert resp.request.headers["Authorization"] == "Bearer new"
 
 
-@patch("coregio.registry_auth.requests.get")
+@patch("coregio.registry_auth.HTTPBearerAuth._get_token")
+def test_HTTPBearerAuth_handle_401_no_token(
+    mock_get_token: MagicMock,
+    bearer_auth: registry_auth.HTTPBearerAuth,
+) -> None:
+    mock_get_token.return_value = None
+    bearer_auth.token_cache["foo"] = "bar"
+    response = _bearer_401_response({"Authorization": "Bearer bar"})
+
+    resp = bearer_auth.handle_401(response, "foo")
+
+    assert resp is response
+    assert "foo" not in bearer_auth.token_cache
+    response.request.copy.assert_not_called()
+    response.connection.send.assert_not_called()
+
+
+@patch("coregio.registry_auth.extract_cookies_to_jar")
+@patch("coregio.registry_auth.HTTPBearerAuth._get_token")
+def test_HTTPBearerAuth_handle_401_concurrent(
+    mock_get_token: MagicMock,
+    mock_extract_cookies_to_jar: MagicMock,
+    bearer_auth: registry_auth.HTTPBearerAuth,
+) -> None:
+    def get_token(auth_info: str, repo: str) -> str:
+        time.sleep(0.05)
+        return "bar"
+
+    mock_get_token.side_effect = get_token
+
+    def handle_401(_: int) -> Any:
+        return bearer_auth.handle_401(_bearer_401_response(), "foo")
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        responses = list(executor.map(handle_401, range(4)))
+
+    mock_get_token.assert_called_once()
+    assert all(
+        resp.request.headers["Authorization"] == "Bearer bar" for resp in responses
+    )
+
+
+@patch("coregio.registry_auth.extract_cookies_to_jar")
+@patch("coregio.registry_auth.HTTPBearerAuth._get_token")
+def test_HTTPBearerAuth_handle_401_concurrent_repos(
+    mock_get_token: MagicMock,
+    mock_extract_cookies_to_jar: MagicMock,
+    bearer_auth: registry_auth.HTTPBearerAuth,
+) -> None:
+    other_repo_fetched = threading.Event()
+
+    def get_token(auth_info: str, repo: str) -> str:
+        # A slow token fetch doesn't block fetching tokens for other repos
+        if repo == "foo":
+            assert other_repo_fetched.wait(5)
+        else:
+            other_repo_fetched.set()
+        return repo
+
+    mock_get_token.side_effect = get_token
+
+    def handle_401(repo: str) -> Any:
+        return bearer_auth.handle_401(_bearer_401_response(), repo)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        responses = list(executor.map(handle_401, ["foo", "bar"]))
+
+    assert [resp.request.headers["Authorization"] for resp in responses] == [
+        "Bearer foo",
+        "Bearer bar",
+    ]
+    assert bearer_auth._get_token_lock("foo") is bearer_auth._get_token_lock("foo")
+    assert bearer_auth._get_token_lock("foo") is not bearer_auth._get_token_lock("bar")
+
+
+@patch("coregio.registry_auth._REALM_SESSION.get")
 @patch("coregio.registry_auth.parse_dict_header")
 def test_HTTPBearerAuth_get_token(
     mock_parse_dict_header: MagicMock,
     mock_get: MagicMock,
     bearer_auth: registry_auth.HTTPBearerAuth,
 ) -> None:
+    registry_auth._parse_bearer_challenge.cache_clear()
     mock_response = MagicMock()
     mock_response.json.return_value = {}
     mock_get.return_value = mock_response
@@ -103,15 +266,135 @@ def test_HTTPBearerAuth_get_token(
     resp = bearer_auth._get_token("foo", "repo")
 
     assert resp == "bar"
+    assert mock_get.call_args.kwargs["proxies"] is None
+    registry_auth._parse_bearer_challenge.cache_clear()
+
+
+@patch("coregio.registry_auth._REALM_SESSION.get")
+def test_HTTPBearerAuth_get_token_proxy(mock_get: MagicMock) -> None:
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = {"token": "bar"}
+    bearer_auth = registry_auth.HTTPBearerAuth("foo", proxy="http://proxy:3128")
+
+    assert bearer_auth._get_token('realm="https://auth/token"', "repo") == "bar"
+    assert mock_get.call_args.kwargs["proxies"] == {"https": "http://proxy:3128"}
+
+
+@patch("coregio.registry_auth._REALM_SESSION.get")
+def test_HTTPBearerAuth_get_token_realm_cache(mock_get: MagicMock) -> None:
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = {"token": "bar"}
+    auth_info = 'realm="https://auth/token",service="registry"'
+
+    assert registry_auth.HTTPBearerAuth("foo")._get_token(auth_info, "repo") == "bar"
+    # Another auth object with the same credentials reuses the token
+    bearer_auth = registry_auth.HTTPBearerAuth("foo")
+    assert bearer_auth._get_token(auth_info, "repo") == "bar"
+    assert mock_get.call_count == 1
+
+    # Tokens are not shared across scopes and credentials
+    bearer_auth._get_token(auth_info, "other")
+    registry_auth.HTTPBearerAuth("baz")._get_token(auth_info, "repo")
+    registry_auth.HTTPBearerAuth("foo", access=("push",))._get_token(auth_info, "repo")
+    assert mock_get.call_count == 4
+
+    # A token rejected by the registry is fetched again
+    mock_get.return_value.json.return_value = {"token": "new"}
+    bearer_auth.token_cache["repo"] = "bar"
+    assert bearer_auth._get_token(auth_info, "repo") == "new"
+    assert registry_auth.HTTPBearerAuth("foo")._get_token(auth_info, "repo") == "new"
+    assert mock_get.call_count == 5
+
+
+@patch("coregio.registry_auth._REALM_SESSION.get")
+def test_HTTPBearerAuth_get_token_realm_cache_disabled(
+    mock_get: MagicMock, monkeypatch: Any
+) -> None:
+    monkeypatch.setattr(registry_auth.HTTPBearerAuth, "REALM_CACHE_TTL", 0)
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = {"access_token": "bar"}
+    auth_info = 'realm="https://auth/token"'
+
+    registry_auth.HTTPBearerAuth("foo")._get_token(auth_info, "repo")
+    registry_auth.HTTPBearerAuth("foo")._get_token(auth_info, "repo")
+
+    assert mock_get.call_count == 2
+    assert registry_auth._REALM_CACHE == {}
+
+
+@patch("coregio.registry_auth.time.monotonic")
+@patch("coregio.registry_auth.time.time")
+def test__set_realm_token(mock_time: MagicMock, mock_monotonic: MagicMock) -> None:
+    mock_time.return_value = 1000
+    mock_monotonic.return_value = 50
+
+    registry_auth._set_realm_token(("realm", "a", ""), "opaque", 120)
+    registry_auth._set_realm_token(("realm", "b", ""), _jwt({"exp": 1030}), 120)
+    # The token expires too soon to be cached
+    registry_auth._set_realm_token(("realm", "c", ""), _jwt({"exp": 1005}), 120)
+
+    assert registry_auth._REALM_CACHE == {
+        ("realm", "a", ""): ("opaque", 100),
+        ("realm", "b", ""): (_jwt({"exp": 1030}), 70),
+    }
+    assert registry_auth._get_realm_token(("realm", "b", "")) == _jwt({"exp": 1030})
+
+    mock_monotonic.return_value = 90
+    assert registry_auth._get_realm_token(("realm", "a", "")) == "opaque"
+    assert registry_auth._get_realm_token(("realm", "b", "")) is None
+    assert registry_auth._get_realm_token(("realm", "c", "")) is None
+
+
+@patch("coregio.registry_auth.REALM_CACHE_SIZE", 2)
+@patch("coregio.registry_auth.time.monotonic")
+def test__set_realm_token_size(mock_monotonic: MagicMock) -> None:
+    mock_monotonic.return_value = 0
+    registry_auth._set_realm_token(("realm", "a", ""), "a", 10)
+    registry_auth._set_realm_token(("realm", "b", ""), "b", 40)
+
+    # The expired token is dropped
+    mock_monotonic.return_value = 20
+    registry_auth._set_realm_token(("realm", "c", ""), "c", 40)
+    assert list(registry_auth._REALM_CACHE) == [("realm", "b", ""), ("realm", "c", "")]
+
+    # The oldest token is dropped
+    registry_auth._set_realm_token(("realm", "d", ""), "d", 40)
+    assert list(registry_auth._REALM_CACHE) == [("realm", "c", ""), ("realm", "d", "")]
+
+    # Updating a cached token doesn't drop any other
+    registry_auth._set_realm_token(("realm", "c", ""), "c", 40)
+    assert list(registry_auth._REALM_CACHE) == [("realm", "c", ""), ("realm", "d", "")]
+
+
+def test_parse_bearer_challenge() -> None:
+    auth_info = 'realm="https://auth/token",service="registry"'
+    bearer_info = registry_auth.parse_bearer_challenge(auth_info)
+
+    assert bearer_info == {"realm": "https://auth/token", "service": "registry"}
+
+    # The cached result is not affected by changes of the returned dict
+    bearer_info.pop("realm")
+    assert registry_auth.parse_bearer_challenge(auth_info) == {
+        "realm": "https://auth/token",
+        "service": "registry",
+    }
 
 
 def test_HTTPBeaderAuth__set_header(bearer_auth: registry_auth.HTTPBearerAuth) -> None:
     response = MagicMock()
     response.headers = {}
-    bearer_auth.token_cache["foo"] = "bar"
-    bearer_auth._set_header(response, "foo")
+    bearer_auth._set_header(response, "bar")
 
     assert response.headers["Authorization"] == "Bearer bar"
+    assert bearer_auth.auth_header == "Bearer bar"
+    header = response.headers["Authorization"]
+
+    bearer_auth._set_header(response, "bar")
+    assert response.headers["Authorization"] is header
+
+    bearer_auth._set_header(response, "baz")
+    assert response.headers["Authorization"] == "Bearer baz"
+    assert bearer_auth.auth_header == "Bearer baz"
 
 
 def test_HTTPBeaderAuth__get_repo_from_url(
@@ -126,3 +409,213 @@ def test_HTTPBeaderAuth__get_repo_from_url(
     repo = bearer_auth._get_repo_from_url(url)
 
     assert repo == "baz"
+
+    assert bearer_auth._get_repo_from_url("/v2/ns/baz/tags/list?n=1") == "ns/baz"
+    assert bearer_auth._get_repo_from_url("/v2/_catalog") is None
+
+
+def test__extract_repo() -> None:
+    assert registry_auth._extract_repo("/v2/ns/repo/manifests/v1") == "ns/repo"
+    assert registry_auth._extract_repo("/foo/v2/repo/tags/list") is None
+
+
+def _jwt(payload: Any) -> str:
+    encoded = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+    return f"header.{encoded.rstrip('=')}.signature"
+
+
+@patch("coregio.registry_auth.time.time")
+def test__get_token_expiration(mock_time: MagicMock) -> None:
+    mock_time.return_value = 1000
+
+    assert registry_auth._get_token_expiration(_jwt({"exp": 2000}), 60) == 2000
+    assert registry_auth._get_token_expiration(_jwt({"foo": "bar"}), 60) == 1060
+    assert registry_auth._get_token_expiration(_jwt(["exp"]), 60) == 1060
+    assert registry_auth._get_token_expiration("header.###.signature", 60) == 1060
+    assert registry_auth._get_token_expiration("opaque", 60) == 1060
+
+
+def test_DiskTokenCache(tmp_path: Any) -> None:
+    path = tmp_path / "cache" / "tokens.json"
+    cache = registry_auth.DiskTokenCache(str(path))
+
+    assert cache.get("foo") is None
+
+    token = _jwt({"exp": time.time() + 3600})
+    cache.set("foo", token)
+    cache.set("bar", "opaque")
+    cache.set("baz", _jwt({"exp": time.time() + 5}))
+
+    assert cache.get("foo") == token
+    assert cache.get("bar") == "opaque"
+    # Token is about to expire
+    assert cache.get("baz") is None
+
+    # Expired tokens are removed
+    cache.set("old", _jwt({"exp": 1}))
+    assert cache.get("old") is None
+    cache.set("new", "opaque")
+    assert "old" not in json.loads(path.read_text())
+
+    path.write_text("[]")
+    assert cache.get("foo") is None
+    path.write_text('{"foo": "bar"}')
+    assert cache.get("foo") is None
+    path.write_text("invalid")
+    assert cache.get("foo") is None
+
+
+def test_DiskTokenCache_reload(tmp_path: Any) -> None:
+    path = tmp_path / "tokens.json"
+    cache = registry_auth.DiskTokenCache(str(path))
+    cache.set("foo", "opaque")
+
+    with patch("coregio.registry_auth.json.load", wraps=json.load) as mock_load:
+        assert cache.get("foo") == "opaque"
+        assert cache.get("foo") == "opaque"
+        assert cache.get("bar") is None
+        # The unchanged file is parsed only once
+        mock_load.assert_called_once()
+
+        # The file is read again once another process updates it
+        other_cache = registry_auth.DiskTokenCache(str(path))
+        other_cache.set("bar", "opaque")
+        assert cache.get("bar") == "opaque"
+
+
+@pytest.mark.parametrize(["unlink_error"], [(None,), (OSError("busy"),)])
+def test_DiskTokenCache_save_tmp_cleanup(tmp_path: Any, unlink_error: Any) -> None:
+    cache = registry_auth.DiskTokenCache(str(tmp_path / "tokens.json"))
+
+    with patch("coregio.registry_auth.os.replace", side_effect=OSError("failed")):
+        with patch(
+            "coregio.registry_auth.os.unlink", side_effect=unlink_error or os.unlink
+        ) as mock_unlink:
+            cache.set("foo", "bar")
+
+    mock_unlink.assert_called_once()
+    if unlink_error is None:
+        assert list(tmp_path.iterdir()) == []
+    assert cache.get("foo") is None
+
+
+def test_DiskTokenCache_default_path(monkeypatch: Any, tmp_path: Any) -> None:
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+
+    cache = registry_auth.DiskTokenCache()
+
+    assert cache.path == str(tmp_path / "coregio" / "tokens.json")
+
+
+def test_DiskTokenCache_save_error(tmp_path: Any) -> None:
+    not_a_directory = tmp_path / "file"
+    not_a_directory.write_text("")
+    cache = registry_auth.DiskTokenCache(str(not_a_directory / "tokens.json"))
+
+    with patch.object(registry_auth.LOG, "warning") as mock_warning:
+        cache.set("foo", "bar")
+
+    mock_warning.assert_called_once()
+    assert cache.get("foo") is None
+
+
+@patch("coregio.registry_auth.extract_cookies_to_jar")
+@patch("coregio.registry_auth.HTTPBearerAuth._get_token")
+def test_HTTPBearerAuth_disk_cache(
+    mock_get_token: MagicMock,
+    mock_extract_cookies_to_jar: MagicMock,
+    tmp_path: Any,
+) -> None:
+    disk_cache = registry_auth.DiskTokenCache(str(tmp_path / "tokens.json"))
+    bearer_auth = registry_auth.HTTPBearerAuth("foo", disk_cache=disk_cache)
+    url = "https://quay.io/v2/repo/manifests/latest"
+
+    response = MagicMock()
+    response.status_code = 401
+    response.url = url
+    response.headers = {"www-authenticate": "bearer realm=foo"}
+    mock_get_token.return_value = "token"
+    bearer_auth.handle_401(response, "repo")
+
+    assert disk_cache.get(bearer_auth._get_cache_key(url, "repo")) == "token"
+
+    # A new auth object loads the token from disk
+    bearer_auth = registry_auth.HTTPBearerAuth("foo", disk_cache=disk_cache)
+    request = MagicMock()
+    request.url = url
+    request.headers = {}
+    bearer_auth(request)
+
+    assert request.headers["Authorization"] == "Bearer token"
+
+    # Token is not shared with different credentials
+    other_auth = registry_auth.HTTPBearerAuth("bar", disk_cache=disk_cache)
+    request = MagicMock()
+    request.url = url
+    other_auth(request)
+
+    request.register_hook.assert_called_once()
+    assert other_auth._get_cache_key(url, "repo") != bearer_auth._get_cache_key(
+        url, "repo"
+    )
+
+
+def test__REALM_SESSION_rejects_cookies() -> None:
+    cookie = requests.cookies.create_cookie(
+        "session", "secret", domain="auth.example.com"
+    )
+    request = urllib.request.Request("https://auth.example.com/token")
+
+    policy = registry_auth._REALM_SESSION.cookies.get_policy()
+    assert not policy.set_ok(cookie, request)
+
+
+@pytest.mark.parametrize(
+    ["auth", "attributes"],
+    [
+        (
+            registry_auth.HTTPBearerAuth("foo"),
+            [
+                "auth_b64",
+                "access",
+                "token_cache",
+                "_token_lock",
+                "_token_locks",
+                "_access_scope",
+            ],
+        ),
+        (registry_auth.HTTPOAuth2("foo"), ["refresh_token", "token_cache"]),
+        (registry_auth.HTTPBasicAuthWithB64("foo"), ["auth", "last_auth_header"]),
+    ],
+)
+def test_auth_slots(auth: Any, attributes: Any) -> None:
+    for attribute in attributes:
+        assert attribute not in vars(auth)
+        assert getattr(auth, attribute) is not None
+
+
+def test_BearerAuthBase__get_credentials() -> None:
+    assert registry_auth.BearerAuthBase()._get_credentials() == ""
+    assert registry_auth.BearerAuthBase()._has_credentials() is False
+
+
+@pytest.mark.parametrize(
+    ["auth", "url", "expected_hook"],
+    [
+        (registry_auth.HTTPBearerAuth(None), "https://quay.io/v2/", True),
+        (registry_auth.HTTPBearerAuth(None), "https://quay.io/v2/_catalog", True),
+        (registry_auth.HTTPBearerAuth(None), "https://quay.io/v2/r/tags/list", True),
+        (registry_auth.HTTPBearerAuth(None), "https://quay.io/api/v1/user", False),
+        (registry_auth.HTTPBearerAuth("foo"), "https://quay.io/api/v1/user", True),
+        (registry_auth.HTTPOAuth2(""), "https://quay.io/api/v1/user", False),
+        (registry_auth.HTTPOAuth2("foo"), "https://quay.io/api/v1/user", True),
+    ],
+)
+def test_BearerAuthBase_hook_registration(
+    auth: Any, url: str, expected_hook: bool
+) -> None:
+    request = MagicMock()
+    request.url = url
+
+    assert auth(request) is request
+    assert request.register_hook.called is expected_hook
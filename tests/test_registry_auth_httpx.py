@@ -0,0 +1,208 @@
+from typing import Any, Callable, List
+from unittest.mock import MagicMock
+
+import httpx
+import pytest
+
+from coregio import registry_auth_httpx
+
+MANIFEST_URL = "https://registry/v2/repo/manifests/latest"
+CHALLENGE = 'Bearer realm="https://auth/token",service="registry"'
+
+
+def _client(
+    auth: httpx.Auth, handler: Callable[[httpx.Request], httpx.Response]
+) -> httpx.Client:
+    return httpx.Client(transport=httpx.MockTransport(handler), auth=auth)
+
+
+def _registry_handler(
+    requests: List[httpx.Request], token_response: httpx.Response
+) -> Callable[[httpx.Request], httpx.Response]:
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.url.host == "auth":
+            return token_response
+        if request.headers.get("Authorization") == "Bearer abc":
+            return httpx.Response(200, json={"schemaVersion": 2})
+        return httpx.Response(401, headers={"www-authenticate": CHALLENGE})
+
+    return handler
+
+
+@pytest.mark.parametrize(
+    ["token_response"],
+    [
+        (httpx.Response(200, json={"token": "abc"}),),
+        (httpx.Response(200, json={"access_token": "abc"}),),
+    ],
+)
+def test_HTTPXBearerAuth(token_response: httpx.Response) -> None:
+    requests: List[httpx.Request] = []
+    auth = registry_auth_httpx.HTTPXBearerAuth("Zm9vOmJhcg==")
+    client = _client(auth, _registry_handler(requests, token_response))
+
+    resp = client.get(MANIFEST_URL)
+
+    assert resp.status_code == 200
+    assert auth.auth_header == "Bearer abc"
+    assert auth.token_cache == {"repo": "abc"}
+    token_request = requests[1]
+    assert token_request.url.params["scope"] == "repository:repo:pull"
+    assert token_request.url.params["service"] == "registry"
+    assert token_request.headers["Authorization"] == "Basic Zm9vOmJhcg=="
+
+    # Cached token is used without the challenge
+    requests.clear()
+    resp = client.get(MANIFEST_URL)
+    assert resp.status_code == 200
+    assert len(requests) == 1
+
+
+def test_HTTPXBearerAuth_token_rotation() -> None:
+    requests: List[httpx.Request] = []
+    rejected_headers: List[str] = []
+    valid_token = "abc"
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.url.host == "auth":
+            return httpx.Response(200, json={"token": valid_token})
+        if request.headers.get("Authorization") == f"Bearer {valid_token}":
+            return httpx.Response(200, json={"schemaVersion": 2})
+        rejected_headers.append(request.headers.get("Authorization", ""))
+        return httpx.Response(401, headers={"www-authenticate": CHALLENGE})
+
+    auth = registry_auth_httpx.HTTPXBearerAuth(None)
+    client = _client(auth, handler)
+    assert client.get(MANIFEST_URL).status_code == 200
+
+    # The cached token expires and the registry issues a new one
+    valid_token = "def"
+    requests.clear()
+    rejected_headers.clear()
+    resp = client.get(MANIFEST_URL)
+
+    assert resp.status_code == 200
+    assert auth.token_cache == {"repo": "def"}
+    assert [request.url.host for request in requests] == [
+        "registry",
+        "auth",
+        "registry",
+    ]
+    assert rejected_headers == ["Bearer abc"]
+    assert requests[2].headers["Authorization"] == "Bearer def"
+
+
+def test_HTTPXBearerAuth_anonymous() -> None:
+    requests: List[httpx.Request] = []
+    auth = registry_auth_httpx.HTTPXBearerAuth(None)
+    token_response = httpx.Response(200, json={"token": "abc"})
+    client = _client(auth, _registry_handler(requests, token_response))
+
+    resp = client.get("https://registry/v2/")
+
+    assert resp.status_code == 200
+    assert "scope" not in requests[1].url.params
+    assert "Authorization" not in requests[1].headers
+    assert auth.token_cache == {None: "abc"}
+
+
+@pytest.mark.parametrize(
+    ["token_response"],
+    [
+        (httpx.Response(403, text="forbidden"),),
+        (httpx.Response(200, json={}),),
+        (httpx.Response(200, text="invalid"),),
+    ],
+)
+def test_HTTPXBearerAuth_no_token(token_response: httpx.Response) -> None:
+    requests: List[httpx.Request] = []
+    auth = registry_auth_httpx.HTTPXBearerAuth(None)
+    client = _client(auth, _registry_handler(requests, token_response))
+
+    resp = client.get(MANIFEST_URL)
+
+    assert resp.status_code == 401
+    assert auth.token_cache == {}
+    assert len(requests) == 3
+
+
+@pytest.mark.parametrize(
+    ["response"],
+    [
+        (httpx.Response(200),),
+        (httpx.Response(401, headers={"www-authenticate": "Basic"}),),
+        (httpx.Response(401, headers={"www-authenticate": 'Basic realm="bearer"'}),),
+    ],
+)
+def test_HTTPXBearerAuth_no_challenge(response: httpx.Response) -> None:
+    requests: List[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return response
+
+    auth = registry_auth_httpx.HTTPXBearerAuth(None)
+    resp = _client(auth, handler).get(MANIFEST_URL)
+
+    assert resp.status_code == response.status_code
+    assert len(requests) == 1
+    assert auth.auth_header is None
+
+
+def test_HTTPXOAuth2() -> None:
+    requests: List[httpx.Request] = []
+    token_response = httpx.Response(
+        200, json={"access_token": "abc", "refresh_token": "new"}
+    )
+    auth = registry_auth_httpx.HTTPXOAuth2("refresh")
+    client = _client(auth, _registry_handler(requests, token_response))
+
+    resp = client.get(MANIFEST_URL)
+
+    assert resp.status_code == 200
+    token_request = requests[1]
+    assert token_request.method == "POST"
+    assert token_request.url == "https://auth/token"
+    form = dict(httpx.QueryParams(token_request.content.decode()))
+    assert form == {
+        "service": "registry",
+        "grant_type": "refresh_token",
+        "refresh_token": "refresh",
+        "client_id": "mercury",
+        "scope": "repository:repo:pull",
+    }
+    assert auth.refresh_token == "new"
+
+    requests.clear()
+    auth = registry_auth_httpx.HTTPXOAuth2("refresh")
+    client = _client(auth, _registry_handler(requests, token_response))
+    client.get("https://registry/v2/")
+    assert "scope" not in requests[1].content.decode()
+
+
+def test_HTTPXOAuth2_no_token() -> None:
+    requests: List[httpx.Request] = []
+    token_response = httpx.Response(200, json={"token": "abc"})
+    auth = registry_auth_httpx.HTTPXOAuth2("refresh")
+    client = _client(auth, _registry_handler(requests, token_response))
+
+    resp = client.get(MANIFEST_URL)
+
+    assert resp.status_code == 401
+    assert auth.refresh_token == "refresh"
+
+
+def test_HTTPXBasicAuthWithB64() -> None:
+    requests: List[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200)
+
+    auth = registry_auth_httpx.HTTPXBasicAuthWithB64("foo")
+    _client(auth, handler).get(MANIFEST_URL)
+
+    assert requests[0].headers["Authorization"] == "Basic foo"
+    assert auth.auth_header == "Basic foo"
@@ -1,15 +1,40 @@
-from unittest.mock import MagicMock
+import logging
+from typing import Any, cast
+from unittest.mock import MagicMock, PropertyMock, patch
 
 import pytest
+from requests import Session
+from requests.adapters import HTTPAdapter
 
 from coregio import utils
 
 
-@pytest.mark.parametrize("status_code", [200, 400, 500])
-def test_handle_response(status_code: int) -> None:
+@pytest.mark.parametrize(
+    ["status_code", "level"],
+    [(200, logging.DEBUG), (400, logging.WARNING), (500, logging.ERROR)],
+)
+def test_handle_response(status_code: int, level: int, caplog: Any) -> None:
     resp = MagicMock()
     resp.status_code = status_code
-    utils.handle_response(resp)
+    resp.text = "x" * 1000
+
+    with caplog.at_level(logging.DEBUG, logger=utils.LOGGER.name):
+        utils.handle_response(resp)
+
+    assert caplog.records[0].levelno == level
+    assert caplog.records[0].getMessage().endswith(" - " + "x" * 512)
+
+
+def test_handle_response_disabled(caplog: Any) -> None:
+    resp = MagicMock()
+    resp.status_code = 200
+    type(resp).text = PropertyMock()
+
+    with caplog.at_level(logging.INFO, logger=utils.LOGGER.name):
+        utils.handle_response(resp)
+
+    assert not caplog.records
+    type(resp).text.assert_not_called()
 
 
 def test_add_session_retries() -> None:
@@ -20,6 +45,62 @@ def test_add_session_retries() -> None:
     assert session.mount.call_count == 2
 
 
+def test_add_session_retries_idempotent() -> None:
+    session = Session()
+    utils.add_session_retries(session)
+    adapter = cast(HTTPAdapter, session.adapters["https://"])
+
+    assert adapter.max_retries is utils._DEFAULT_RETRY
+    assert adapter.poolmanager.connection_pool_kw["maxsize"] == utils.DEFAULT_POOL_SIZE
+    assert session.adapters["http://"] is adapter
+
+    utils.add_session_retries(session)
+    assert session.adapters["https://"] is adapter
+
+    utils.add_session_retries(session, pool_size=8)
+    new_adapter = cast(HTTPAdapter, session.adapters["https://"])
+    assert new_adapter is not adapter
+    assert new_adapter.max_retries is utils._DEFAULT_RETRY
+
+    utils.add_session_retries(session, total=3, status_forcelist=[500])
+    retries = cast(HTTPAdapter, session.adapters["https://"]).max_retries
+    assert retries is not utils._DEFAULT_RETRY
+    assert retries.total == 3
+    assert retries.status_forcelist == [500]
+    assert retries.raise_on_status is False
+
+
+def test_make_shared_session() -> None:
+    session = utils.make_shared_session(pool_size=5)
+    adapter = cast(HTTPAdapter, session.adapters["https://"])
+
+    assert adapter.max_retries.total == 10
+    assert adapter.poolmanager.connection_pool_kw["maxsize"] == 5
+    assert session.adapters["http://"] is adapter
+
+
+def test_json_loads() -> None:
+    assert utils.json_loads('{"foo": [1, "bar"]}') == {"foo": [1, "bar"]}
+    assert utils.json_loads(b'{"foo": 1.5}') == {"foo": 1.5}
+    with pytest.raises(ValueError):
+        utils.json_loads("not a json")
+
+    with patch("coregio.utils.orjson", None):
+        assert utils.json_loads('{"foo": [1, "bar"]}') == {"foo": [1, "bar"]}
+        with pytest.raises(ValueError):
+            utils.json_loads("not a json")
+
+
+def test_response_json() -> None:
+    resp = MagicMock()
+    resp.content = b'{"foo": "bar"}'
+
+    assert utils.response_json(resp) == {"foo": "bar"}
+
+    with patch("coregio.utils.orjson", None):
+        assert utils.response_json(resp) == resp.json.return_value
+
+
 @pytest.mark.parametrize(
     ["url", "expected_url"],
     [